@@ -0,0 +1,90 @@
+# Compares ways of loading the two source sheets into prepared frames on a wide
+# synthetic workbook: the old full-width ExcelFile.parse, the projected read
+# (usecols + dtypes, calamine when installed), the streaming openpyxl reader,
+# and pre-exported CSV and Parquet files.
+#
+#   python benchmarks/bench_loader.py --rows 20000 --extra-columns 60
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import gen_html  # noqa: E402
+from synthetic import write_workbook  # noqa: E402
+
+
+def legacy_load(input_excel):
+    xls = pd.ExcelFile(input_excel, engine="openpyxl")
+    frames = {entity: gen_html.prepare_sheet(xls.parse(sheet)) for entity, sheet in gen_html.ENTITY_SHEETS.items()}
+    return gen_html.disambiguate_names(frames)
+
+
+def projected_load(engine):
+    def load(input_excel):
+        previous, gen_html.EXCEL_ENGINE = gen_html.EXCEL_ENGINE, engine
+        try:
+            return gen_html.load_prepared_sheets(input_excel)
+        finally:
+            gen_html.EXCEL_ENGINE = previous
+    return load
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--extra-columns", type=int, default=60, help="unused columns per sheet")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = write_workbook(os.path.join(tmp, "wide.xlsx"), args.rows, extra_columns=args.extra_columns)
+        xls = pd.ExcelFile(workbook)
+        for sheet in gen_html.ENTITY_SHEETS.values():
+            raw = xls.parse(sheet)
+            raw.to_csv(os.path.join(tmp, f"{sheet}.csv"), index=False)
+            raw.to_parquet(os.path.join(tmp, f"{sheet}.parquet"))
+
+        loaders = [
+            ("full-width parse (old)", legacy_load, workbook),
+            ("usecols + dtypes, openpyxl", projected_load("openpyxl"), workbook),
+            ("streaming openpyxl", lambda path: gen_html.load_prepared_sheets(path, read_chunksize=10_000), workbook),
+        ]
+        try:
+            import python_calamine  # noqa: F401
+            loaders.append(("usecols + dtypes, calamine", projected_load("calamine"), workbook))
+        except ImportError:
+            print("python-calamine not installed; skipping the calamine engine")
+        loaders += [
+            ("csv", projected_load(gen_html.EXCEL_ENGINE), os.path.join(tmp, "{sheet}.csv")),
+            ("parquet", projected_load(gen_html.EXCEL_ENGINE), os.path.join(tmp, "{sheet}.parquet")),
+        ]
+
+        print(f"{args.rows:,} rows, {len(raw.columns)} columns per sheet")
+        baseline, expected = None, None
+        for label, load, source in loaders:
+            seconds, frames = best_of(load, source, args.repeat)
+            if expected is None:
+                baseline, expected = seconds, frames
+            else:
+                for entity, df in expected.items():
+                    pd.testing.assert_frame_equal(frames[entity].reset_index(drop=True), df.reset_index(drop=True),
+                                                  check_dtype=False)
+            print(f"{label:<28} {seconds:8.3f}s  {baseline / seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
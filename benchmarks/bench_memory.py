@@ -0,0 +1,114 @@
+# Peak RSS of a full build for the original generator and for the in-memory and
+# streaming output paths on synthetic workbooks of increasing size. Each build
+# runs in a fresh process. The original generator (row dicts of formatted
+# strings repr()'d into one f-string page) is taken from --baseline-rev, the
+# repository's first commit by default.
+#
+#   python benchmarks/bench_memory.py --rows 10000 50000 100000
+#   python benchmarks/bench_memory.py --rows 50000 --extra-columns 40   # wide sheets
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+BASELINE_CONFIG = "baseline (repr)"
+CONFIGS = {
+    BASELINE_CONFIG: None,
+    # Same records layout through the current pipeline, whole page joined in memory.
+    "records, in-memory": dict(payload_format="records", stream_output=False),
+    "columnar, in-memory": dict(payload_format="columnar", stream_output=False),
+    "columnar, streaming": dict(payload_format="columnar", stream_output=True),
+    "columnar, streaming + chunked read": dict(payload_format="columnar", stream_output=True,
+                                               read_chunksize=10_000),
+}
+
+
+def peak_rss_mb():
+    # VmHWM starts fresh at exec, unlike ru_maxrss which a child can inherit
+    # from the parent on Linux.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def baseline_generator(tmp, rev):
+    # The generator as of rev, written to tmp; None when git cannot provide it.
+    if rev is None:
+        rev = subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True).stdout.split()[-1:]
+        rev = rev[0] if rev else "HEAD"
+    source = subprocess.run(["git", "show", f"{rev}:gen_html.py"], cwd=REPO_DIR, capture_output=True, text=True)
+    if source.returncode != 0:
+        print(f"Cannot read gen_html.py at {rev}; skipping the baseline: {source.stderr.strip()}")
+        return None
+    path = os.path.join(tmp, "baseline_gen_html.py")
+    with open(path, "w") as f:
+        f.write(source.stdout)
+    return path
+
+
+def run_worker(config_name, workbook, output_html, generator_path):
+    if config_name == BASELINE_CONFIG:
+        sys.path.insert(0, os.path.dirname(generator_path))
+        generator, options = __import__(os.path.splitext(os.path.basename(generator_path))[0]), {}
+    else:
+        import gen_html as generator
+        options = CONFIGS[config_name]
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    generator.generate_sped_funding_gap_html(workbook, output_html, **options)
+    elapsed = time.perf_counter() - start
+    print(f"{baseline:.1f} {peak_rss_mb():.1f} {elapsed:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="unused columns per sheet; whole-sheet readers pay for them, streaming ones do not")
+    parser.add_argument("--baseline-rev", help="git revision of the baseline generator (default: first commit)")
+    parser.add_argument("--worker", nargs=4, metavar=("CONFIG", "WORKBOOK", "OUTPUT", "GENERATOR"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    from synthetic import write_workbook
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator_path = baseline_generator(tmp, args.baseline_rev)
+        configs = [name for name in CONFIGS if generator_path is not None or name != BASELINE_CONFIG]
+        print(f"{'rows':>9}  {'config':<34} {'start MB':>10} {'peak MB':>9} {'delta MB':>9} {'seconds':>8}")
+        for n_rows in args.rows:
+            workbook = write_workbook(os.path.join(tmp, f"synthetic_{n_rows}.xlsx"), n_rows,
+                                      extra_columns=args.extra_columns)
+            for config_name in configs:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", config_name, workbook, os.path.join(tmp, "index.html"),
+                     str(generator_path)],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                baseline, peak, elapsed = (float(v) for v in output[-3:])
+                print(f"{n_rows:>9,}  {config_name:<34} {baseline:>10.1f} {peak:>9.1f} {peak - baseline:>9.1f} "
+                      f"{elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
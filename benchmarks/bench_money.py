@@ -0,0 +1,88 @@
+# Compares the old per-row money parsing/formatting lambdas with the vectorized
+# stage in gen_html.py on a synthetic sheet.
+#
+#   python benchmarks/bench_money.py --rows 100000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gen_html  # noqa: E402
+from synthetic import make_sheet  # noqa: E402
+
+
+GAP_COLUMN = "2022-2023 Special Education Funding Gap"
+KEEP = gen_html.COLUMNS_TO_KEEP + [GAP_COLUMN]
+RENAME = {**gen_html.COLUMN_RENAME, GAP_COLUMN: "SPED Funding Gap"}
+
+
+def legacy_parse(df):
+    df = df[KEEP].rename(columns=RENAME)
+    df["SPED Funding Gap Raw"] = df["SPED Funding Gap"].replace(r'[\$,]', '', regex=True).astype(float)
+    df["Spent"] = df["SPED District Expenditure (GF)"].apply(
+        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+    )
+    df["Received"] = df["SPED State Funding"].apply(
+        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+    )
+    return df
+
+
+def legacy_format(df):
+    df = df.copy()
+    df["Enrollment"] = df["Enrollment"].apply(gen_html.format_enrollment)
+    for col in ["Spent", "Received", "SPED Funding Gap Raw"]:
+        df[col] = df[col].apply(gen_html.format_currency)
+    return df
+
+
+def vectorized_parse(df):
+    df = df[KEEP].rename(columns=RENAME)
+    for col in ["Enrollment"] + gen_html.MONEY_COLUMNS:
+        df[col] = gen_html.parse_money(df[col]).fillna(0)
+    return df
+
+
+def vectorized_format(df):
+    df = df.copy()
+    df["Enrollment"] = gen_html.format_enrollment_series(df["Enrollment"])
+    for col in gen_html.MONEY_COLUMNS:
+        df[col] = gen_html.format_currency_series(df[col])
+    return df
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for text_money in (False, True):
+        sheet = make_sheet(args.rows, text_money=text_money)
+        legacy_parse_s, legacy_df = best_of(legacy_parse, sheet, args.repeat)
+        new_parse_s, new_df = best_of(vectorized_parse, sheet, args.repeat)
+        assert (legacy_df["SPED Funding Gap Raw"].to_numpy() == new_df["SPED Funding Gap"].to_numpy()).all()
+        legacy_format_s, _ = best_of(legacy_format, legacy_df, args.repeat)
+        new_format_s, _ = best_of(vectorized_format, new_df, args.repeat)
+
+        kind = "text" if text_money else "numeric"
+        print(f"{args.rows:,} rows, {kind} money cells")
+        print(f"  parse:  legacy {legacy_parse_s * 1000:8.1f} ms  vectorized {new_parse_s * 1000:8.1f} ms  "
+              f"({legacy_parse_s / new_parse_s:.1f}x)")
+        print(f"  format: legacy {legacy_format_s * 1000:8.1f} ms  vectorized {new_format_s * 1000:8.1f} ms  "
+              f"({legacy_format_s / new_format_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# End-to-end benchmark of generate_sped_funding_gap_html on synthetic workbooks.
+#
+# For each size it builds the page twice in fresh processes: once plainly for the
+# end-to-end time, and once with stage profiling on for the per-stage wall/CPU
+# time and peak memory (tracemalloc slows the profiled build down several times,
+# so its timings are only comparable with each other). It also records the output
+# HTML size and how long the embedded data payloads take to parse. Results are compared with a
+# stored baseline so performance work can be measured offline:
+#
+#   python benchmarks/run_benchmarks.py --sizes 1k 10k           # compare with baseline
+#   python benchmarks/run_benchmarks.py --update-baseline        # record a new baseline
+#   python benchmarks/run_benchmarks.py --check                  # exit 1 on regressions
+#
+# Generated workbooks are kept in benchmarks/.workbooks; the 1m workbook takes a
+# few minutes to write the first time.
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from synthetic import write_workbook  # noqa: E402
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+WORKBOOK_DIR = os.path.join(BENCH_DIR, ".workbooks")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Metrics compared against the baseline, all "lower is better", with the absolute
+# change below which a ratio over the threshold is treated as noise.
+COMPARED_METRICS = {"wall_s": 0.05, "peak_mem_delta_mb": 1.0, "html_bytes": 1024, "payload_parse_s": 0.005}
+
+
+def workbook_for(size_name):
+    os.makedirs(WORKBOOK_DIR, exist_ok=True)
+    path = os.path.join(WORKBOOK_DIR, f"synthetic_{size_name}.xlsx")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        write_workbook(path, SIZES[size_name])
+        print(f"  wrote {path} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def payload_parse_seconds(html_path, repeat=3):
+    with open(html_path) as f:
+        html = f.read()
+    payloads = re.findall(r'<script type="application/json" id="[^"]+">(.*?)</script>', html, re.S)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            json.loads(payload)
+        best = min(best, time.perf_counter() - start)
+    result = {"payload_parse_s": best}
+
+    # JSON.parse in node is a closer stand-in for the browser, when available.
+    node = shutil.which("node")
+    if node and payloads:
+        script = ("const fs=require('fs');const p=JSON.parse(fs.readFileSync(0,'utf8'));let best=1e9;"
+                  f"for(let r=0;r<{repeat};r++){{const t=process.hrtime.bigint();for(const s of p)JSON.parse(s);"
+                  "best=Math.min(best,Number(process.hrtime.bigint()-t)/1e9);}console.log(best);")
+        output = subprocess.run([node, "-e", script], input=json.dumps(payloads), capture_output=True, text=True)
+        if output.returncode == 0:
+            result["payload_parse_node_s"] = float(output.stdout.strip())
+    return result
+
+
+def run_size(size_name, build_options):
+    workbook = workbook_for(size_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_html = os.path.join(tmp, "index.html")
+        code = ("import json, sys, time, gen_html; start = time.perf_counter(); "
+                "gen_html.generate_sped_funding_gap_html(sys.argv[1], sys.argv[2], **json.loads(sys.argv[3])); "
+                "print(time.perf_counter() - start)")
+        timed = subprocess.run([sys.executable, "-c", code, workbook, output_html, json.dumps(build_options)],
+                               cwd=REPO_DIR, check=True, capture_output=True, text=True)
+        wall_s = float(timed.stdout.strip().splitlines()[-1])
+
+        profiled_options = {**build_options, "profile": True}
+        subprocess.run([sys.executable, "-c", code, workbook, output_html, json.dumps(profiled_options)],
+                       cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+        with open(os.path.join(tmp, "index.profile.json")) as f:
+            profile = json.load(f)
+
+        stages = {stage["name"]: stage for stage in profile["stages"]}
+        total = stages.pop("total")
+        return {
+            "rows": SIZES[size_name],
+            "wall_s": wall_s,
+            "peak_mem_delta_mb": total["peak_mem_delta_mb"],
+            "html_bytes": os.path.getsize(output_html),
+            **payload_parse_seconds(output_html),
+            "stages": stages,
+        }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for size_name, result in results.items():
+        base = baseline.get("results", {}).get(size_name)
+        if base is None:
+            print(f"{size_name}: no baseline")
+            continue
+        for metric, noise in COMPARED_METRICS.items():
+            if metric not in base or not base[metric]:
+                continue
+            ratio = result[metric] / base[metric]
+            flag = "REGRESSION" if ratio > threshold and result[metric] - base[metric] > noise else ""
+            print(f"{size_name:>5} {metric:<18} {base[metric]:>14.4f} -> {result[metric]:>14.4f}  {ratio:5.2f}x {flag}")
+            if flag:
+                regressions.append((size_name, metric, ratio))
+        for name, stage in result["stages"].items():
+            base_stage = base.get("stages", {}).get(name)
+            if base_stage and base_stage["wall_s"] > 0.01:
+                ratio = stage["wall_s"] / base_stage["wall_s"]
+                print(f"{size_name:>5}   stage {name:<20} {base_stage['wall_s']:>8.3f}s -> {stage['wall_s']:>8.3f}s  "
+                      f"{ratio:5.2f}x (profiled)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SPED funding gap build on synthetic workbooks.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any metric regresses past --threshold")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed ratio over baseline (default 1.25)")
+    parser.add_argument("--build-options", default="{}",
+                        help="JSON keyword arguments for generate_sped_funding_gap_html, e.g. '{\"read_chunksize\": 10000}'")
+    parser.add_argument("--output", help="also write the raw results to this JSON file")
+    args = parser.parse_args()
+    build_options = json.loads(args.build_options)
+
+    results = {}
+    for size_name in args.sizes:
+        print(f"{size_name} ({SIZES[size_name]:,} rows)")
+        result = results[size_name] = run_size(size_name, build_options)
+        node = f", node parse {result['payload_parse_node_s'] * 1000:.1f} ms" if "payload_parse_node_s" in result else ""
+        print(f"  {result['wall_s']:.2f}s wall, {result['peak_mem_delta_mb']:.1f} MB traced peak, "
+              f"{result['html_bytes']:,} bytes HTML, payload parse {result['payload_parse_s'] * 1000:.1f} ms{node}")
+        print("  profiled stages:")
+        for name, stage in sorted(result["stages"].items(), key=lambda item: -item[1]["wall_s"]):
+            print(f"    {name:<20} {stage['wall_s']:8.3f}s wall {stage['cpu_s']:8.3f}s cpu "
+                  f"{stage['peak_mem_delta_mb']:8.1f} MB")
+
+    report = {"python": sys.version.split()[0], "build_options": build_options, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({k: v for k, v in report.items() if k != "results"})
+        baseline["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Updated baseline {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions and args.check:
+        print(f"{len(regressions)} metric(s) regressed more than {args.threshold:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+
+
+def make_sheet(n_rows, seed=0, text_money=False, extra_columns=0):
+    # A Sheet1/Sheet2-shaped frame with the columns gen_html.py reads plus a few
+    # it ignores, like the TEA source workbooks; extra_columns adds more unused
+    # numeric columns to mimic their full width. About 2% of names repeat, so
+    # name disambiguation has some work to do.
+    rng = np.random.default_rng(seed)
+    enrollment = rng.integers(50, 200_000, n_rows)
+    spent = (enrollment * rng.uniform(300, 2_500, n_rows)).round()
+    received = (enrollment * rng.uniform(300, 2_500, n_rows)).round()
+    gap = received - spent
+    df = pd.DataFrame({
+        "DISTRICT NUMBER": rng.choice(np.arange(1_000, 999_999), n_rows, replace=n_rows > 998_999),
+        "DISTRICT NAME": [f"District {i - (i % 50 == 1)} ISD" for i in range(n_rows)],
+        "COUNTY": [f"County {i}" for i in rng.integers(0, 254, n_rows)],
+        "REGION": rng.integers(1, 21, n_rows),
+        "Enrollment": enrollment,
+        "GF Students with Disabilities (PICs 23,33,43)": spent,
+        "23-Special Education Adjusted Allotment 48.102": received,
+        "2022-2023 Special Education Funding Gap": gap,
+    })
+    if text_money:
+        for col in ["GF Students with Disabilities (PICs 23,33,43)",
+                    "23-Special Education Adjusted Allotment 48.102",
+                    "2022-2023 Special Education Funding Gap"]:
+            df[col] = [f"-${abs(int(v)):,}" if v < 0 else f"${int(v):,}" for v in df[col]]
+    for i in range(extra_columns):
+        df[f"Unused Column {i}"] = rng.integers(0, 1_000_000, n_rows)
+    return df
+
+
+def write_workbook(path, n_rows, charter_ratio=0.2, seed=0, extra_columns=0):
+    # Write-only openpyxl is several times faster than DataFrame.to_excel, which
+    # matters at a million rows.
+    n_charters = max(int(n_rows * charter_ratio), 1)
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet, rows, sheet_seed in (("Sheet1", n_rows - n_charters, seed), ("Sheet2", n_charters, seed + 1)):
+        df = make_sheet(rows, seed=sheet_seed, extra_columns=extra_columns)
+        worksheet = workbook.create_sheet(sheet)
+        worksheet.append(list(df.columns))
+        for row in df.itertuples(index=False, name=None):
+            worksheet.append([v.item() if hasattr(v, "item") else v for v in row])
+    workbook.save(path)
+    return path
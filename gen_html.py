@@ -1,110 +1,1151 @@
 import pandas as pd
+import argparse
+import base64
+import concurrent.futures
+import contextlib
+import cProfile
+import datetime
+import functools
+import gzip
+import hashlib
+import http.server
+import importlib.util
+import itertools
+import json
+import openpyxl
 import os
-import subprocess
+import re
+import shutil
+import sys
 import textwrap
+import threading
+import time
+import traceback
+import tracemalloc
+import urllib.request
 
-def generate_sped_funding_gap_html(input_excel, output_html, development_mode=False):
-    xls = pd.ExcelFile(input_excel)
-    sheet1_df = xls.parse('Sheet1')
-    sheet2_df = xls.parse('Sheet2')
-
-    columns_to_keep = [
-        "DISTRICT NUMBER",
-        "DISTRICT NAME",
-        "Enrollment",
-        "GF Students with Disabilities (PICs 23,33,43)",
-        "23-Special Education Adjusted Allotment 48.102",
-        "2022-2023 Special Education Funding Gap"
-    ]
-    column_rename = {
-        "DISTRICT NUMBER": "District Number",
-        "DISTRICT NAME": "District Name",
-        "Enrollment": "Enrollment",
-        "GF Students with Disabilities (PICs 23,33,43)": "SPED District Expenditure (GF)",
-        "23-Special Education Adjusted Allotment 48.102": "SPED State Funding",
-        "2022-2023 Special Education Funding Gap": "SPED Funding Gap"
-    }
+try:
+    import pyarrow
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    # Arrow-backed strings make the .str money parsing run in compiled kernels.
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    pc = pq = None
+    STRING_DTYPE = "string"
+
+try:
+    import python_calamine  # noqa: F401
+    # The Rust calamine reader parses workbooks several times faster than openpyxl.
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+try:
+    import brotli
+except ImportError:
+    # The bundling pass then writes only .gz siblings.
+    brotli = None
+
+PAYLOAD_FORMATS = ("columnar", "records")
+
+# Set SPED_PROFILE=1 to write a per-stage timing/memory report next to the page,
+# or SPED_PROFILE=cprofile to also dump cProfile stats.
+PROFILE_ENV_VAR = "SPED_PROFILE"
+
+
+COLUMNS_TO_KEEP = [
+    "DISTRICT NUMBER",
+    "DISTRICT NAME",
+    "Enrollment",
+    "GF Students with Disabilities (PICs 23,33,43)",
+    "23-Special Education Adjusted Allotment 48.102",
+]
+COLUMN_RENAME = {
+    "DISTRICT NUMBER": "District Number",
+    "DISTRICT NAME": "District Name",
+    "Enrollment": "Enrollment",
+    "GF Students with Disabilities (PICs 23,33,43)": "SPED District Expenditure (GF)",
+    "23-Special Education Adjusted Allotment 48.102": "SPED State Funding",
+}
+# The funding gap column is named for its school year, e.g. "2022-2023 Special
+# Education Funding Gap"; prepared frames carry that year as "School Year".
+GAP_COLUMN_PATTERN = re.compile(r"^(\d{4}-\d{4}) Special Education Funding Gap$")
+MONEY_COLUMNS = ["SPED District Expenditure (GF)", "SPED State Funding", "SPED Funding Gap"]
+ENTITY_SHEETS = {"districts": "Sheet1", "charters": "Sheet2"}
+ENTITY_LABELS = {"districts": "Districts", "charters": "Charters"}
+
+# Optional grouping columns carried through when a workbook has them, so batch
+# jobs can build per-region or per-county pages.
+DIMENSION_COLUMNS = {
+    "REGION": "Region",
+    "ESC REGION": "Region",
+    "COUNTY": "County",
+    "COUNTY NAME": "County",
+}
+
+# Every source column the loader reads; the TEA workbooks have dozens more.
+SOURCE_COLUMNS = COLUMNS_TO_KEEP + list(DIMENSION_COLUMNS)
+
+# Read-time dtypes for source columns whose type is known up front. The money
+# columns are left to parse_money, since some exports store them as "$1,234" text.
+SOURCE_DTYPES = {
+    "DISTRICT NUMBER": "Int64",
+    "DISTRICT NAME": str,
+    "COUNTY": str,
+    "COUNTY NAME": str,
+}
+
+# Pre-exported inputs, one file per sheet; anything else is read as a workbook.
+EXPORT_FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+
+# Rows serialized per write when streaming the data payload into the page.
+PAYLOAD_CHUNK_ROWS = 5_000
+
+# Payload fields of the sortable table columns, in table column order.
+ORDER_KEYS = ["name", "enrollment", "spent", "received", "gap"]
+
+# render_report keyword arguments a batch manifest job may set.
+BATCH_RENDER_OPTIONS = {
+    "payload_format", "report_payload_size", "stream_output", "shard_dir", "shard_page_sizes", "bundle",
+}
+
+# Shard layout: one directory per sortable table column and direction, holding
+# one file per page for each DataTables page length.
+SHARD_PAGE_SIZES = (10, 25, 50, 100)
+
+# Third-party assets the page loads: the CDN URL and the file the bundling pass
+# vendors it to. Versions are pinned so vendored copies match the CDN.
+VENDOR_ASSETS = {
+    "datatables_css": ("https://cdn.datatables.net/1.13.4/css/jquery.dataTables.min.css",
+                       "jquery.dataTables-1.13.4.min.css"),
+    "jquery": ("https://code.jquery.com/jquery-3.6.0.min.js", "jquery-3.6.0.min.js"),
+    "datatables": ("https://cdn.datatables.net/1.13.4/js/jquery.dataTables.min.js", "jquery.dataTables-1.13.4.min.js"),
+    "chartjs": ("https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js", "chart-4.4.1.umd.min.js"),
+}
+
+# Vendored assets live here, relative to the page.
+VENDOR_DIR = "vendor"
+
+# Artifacts the bundling pass precompresses; images are already compressed.
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".css", ".json", ".svg")
+
+# Pages longer than this are drawn as this many bars of grouped rows.
+CHART_MAX_BARS = 50
+
+# Lower bounds of the enrollment bands the analytics group on.
+ENROLLMENT_BANDS = [
+    (0, "Under 500"),
+    (500, "500-1,999"),
+    (2_000, "2,000-9,999"),
+    (10_000, "10,000-49,999"),
+    (50_000, "50,000+"),
+]
+
+# Funding gap percentiles reported per group, and bins in the per-student gap
+# histogram.
+GAP_PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 20
+
+# Multi-year store: one long-format partition per school year, keyed by district
+# number. Bump TIMESERIES_VERSION when the partition layout changes.
+TIMESERIES_VERSION = 1
+TIMESERIES_COLUMNS = [
+    "School Year", "District Number", "Entity", "District Name", "Enrollment",
+    "SPED District Expenditure (GF)", "SPED State Funding", "SPED Funding Gap",
+]
+
+# Bump when prepare_sheet or gap_analytics changes so cached results are rebuilt.
+CACHE_VERSION = 6
+
+# Development server: the page and its assets are served from the output
+# directory, and open pages reload when a rebuild finishes.
+DEV_SERVER_PORT = 8000
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = f'<script>new EventSource("{LIVE_RELOAD_PATH}").onmessage = () => location.reload();</script>'
+WATCH_INTERVAL = 0.25
+
+
+class StageProfiler:
+    # Wall time, CPU time and peak traced memory per named build stage. Stages may
+    # nest and may repeat (e.g. once per sheet); repeats are accumulated.
 
-    sheet1_sorted = sheet1_df.sort_values(by="2022-2023 Special Education Funding Gap", ascending=False)
-    sheet2_sorted = sheet2_df.sort_values(by="2022-2023 Special Education Funding Gap", ascending=False)
+    def __init__(self):
+        self.stages = {}
+        self.stack = []
 
-    districts_sorted = sheet1_sorted[columns_to_keep].rename(columns=column_rename)
-    charters_sorted = sheet2_sorted[columns_to_keep].rename(columns=column_rename)
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.stack:
+            # reset_peak() below would lose the enclosing stage's peak so far.
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame = {"peak": current}
+        self.stack.append(frame)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            self.stack.pop()
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            totals = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mem_delta_mb": 0.0})
+            totals["calls"] += 1
+            totals["wall_s"] += wall
+            totals["cpu_s"] += cpu
+            totals["peak_mem_delta_mb"] = max(totals["peak_mem_delta_mb"], (peak - current) / (1024 * 1024))
 
-    districts_sorted["SPED Funding Gap Raw"] = districts_sorted["SPED Funding Gap"].replace(r'[\$,]', '', regex=True).astype(float)
-    charters_sorted["SPED Funding Gap Raw"] = charters_sorted["SPED Funding Gap"].replace(r'[\$,]', '', regex=True).astype(float)
+    def report(self, **extra):
+        stages = [{"name": name, **{k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()}}
+                  for name, totals in self.stages.items()]
+        return {"created": datetime.datetime.now().isoformat(timespec="seconds"), **extra, "stages": stages}
 
-    def disambiguate_names(df):
-        df["District Number"] = df["District Number"].apply(lambda x: f"'{int(x):06d}")
-        duplicates = df["District Name"].duplicated(keep=False)
-        df.loc[duplicates, "District Name"] = df.loc[duplicates].apply(
-            lambda row: f"{row['District Name']} - {row['District Number']}", axis=1
+
+# The profiler of the build in progress, if profiling was requested.
+ACTIVE_PROFILER = None
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    if ACTIVE_PROFILER is None:
+        yield
+    else:
+        with ACTIVE_PROFILER.stage(name):
+            yield
+
+
+def profile_iter(name, iterable):
+    # Attributes the time spent producing each item (e.g. lazily serialized JSON)
+    # to a stage, separately from whatever consumes the items.
+    iterator = iter(iterable)
+    while True:
+        with profile_stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def normalize_ids(df):
+    # District numbers stay integers: the join key across sheets and years, and the
+    # number the client pads to six digits for display and search.
+    df["District Number"] = df["District Number"].astype("int64")
+    return df
+
+
+def padded_ids(numbers):
+    return numbers.astype(str).str.zfill(6)
+
+
+def disambiguate_names(frames):
+    # Names shared by more than one row anywhere in the combined dataset get
+    # " - 'NNNNNN" appended. Rows still colliding after that (a repeated number, or
+    # a suffixed name matching another row's name) get their entity label, then an
+    # occurrence count.
+    combined = pd.concat(
+        [pd.DataFrame({"entity": entity, "name": df["District Name"], "number": df["District Number"]})
+         for entity, df in frames.items()],
+        ignore_index=True,
+    )
+    names = combined["name"].copy()
+    duplicates = names.duplicated(keep=False)
+    names[duplicates] = names[duplicates] + " - '" + padded_ids(combined["number"][duplicates])
+
+    duplicates = names.duplicated(keep=False)
+    if duplicates.any():
+        names[duplicates] = names[duplicates] + " (" + combined["entity"][duplicates].map(ENTITY_LABELS) + ")"
+        duplicates = names.duplicated(keep=False)
+        if duplicates.any():
+            occurrence = names[duplicates].groupby(names[duplicates]).cumcount() + 1
+            names[duplicates] = names[duplicates] + " #" + occurrence.astype(str)
+
+    disambiguated, start = {}, 0
+    for entity, df in frames.items():
+        df = df.copy()
+        df["District Name"] = names.iloc[start:start + len(df)].to_numpy()
+        disambiguated[entity] = df
+        start += len(df)
+    return disambiguated
+
+
+def parse_money(series):
+    # Vectorized parse of money/count cells that may be numbers or text such as
+    # "$1,234", "-$1,234", "$-1,234" or "(1,234)". Blank cells become NaN.
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    text = (series.astype(STRING_DTYPE)
+            .str.replace(",", "", regex=False)
+            .str.replace("$", "", regex=False)
+            .str.strip())
+    parenthesized = text.str.startswith("(").fillna(False).astype(bool)
+    text = text.str.strip("()").replace("", pd.NA)
+    try:
+        values = text.astype("Float64").astype(float)
+    except (TypeError, ValueError):
+        # Stray non-numeric text: fall back to the slower, forgiving parser.
+        values = pd.to_numeric(text, errors="coerce").astype(float)
+    return values.where(~parenthesized, -values.abs())
+
+
+def present_dimensions(columns):
+    dimensions = {}
+    for source, target in DIMENSION_COLUMNS.items():
+        if source in columns and target not in dimensions.values():
+            dimensions[source] = target
+    return dimensions
+
+
+def gap_column(columns):
+    matches = [col for col in columns if isinstance(col, str) and GAP_COLUMN_PATTERN.match(col)]
+    if len(matches) != 1:
+        raise KeyError(f"Expected one '<YYYY-YYYY> Special Education Funding Gap' column, found {matches or 'none'}")
+    return matches[0]
+
+
+def is_source_column(col):
+    return col in SOURCE_COLUMNS or (isinstance(col, str) and GAP_COLUMN_PATTERN.match(col) is not None)
+
+
+def clean_columns(df):
+    with profile_stage("rename"):
+        dimensions = present_dimensions(df.columns)
+        gap = gap_column(df.columns)
+        df = df[COLUMNS_TO_KEEP + [gap] + list(dimensions)].rename(
+            columns={**COLUMN_RENAME, gap: "SPED Funding Gap", **dimensions}
         )
-        return df
+        df["School Year"] = pd.Categorical([GAP_COLUMN_PATTERN.match(gap).group(1)] * len(df))
+
+    # Parse each numeric column exactly once; blank cells count as zero.
+    with profile_stage("parse"):
+        for col in ["Enrollment"] + MONEY_COLUMNS:
+            df[col] = parse_money(df[col]).fillna(0)
+    return df
+
+
+def finish_sheet(df):
+    with profile_stage("sort"):
+        df = df.sort_values(by="SPED Funding Gap", ascending=False)
+    with profile_stage("id normalization"):
+        return normalize_ids(df)
+
+
+def prepare_sheet(df):
+    return finish_sheet(clean_columns(df))
+
+
+def prepare_sheet_chunks(chunks):
+    # Only the six kept columns of each chunk survive cleanup, so the full-width
+    # sheet is never held in memory at once.
+    cleaned = [clean_columns(chunk) for chunk in chunks]
+    return finish_sheet(pd.concat(cleaned, ignore_index=True))
+
+
+def source_format(path):
+    return EXPORT_FORMATS.get(os.path.splitext(path)[1].lower(), "excel")
+
+
+def source_paths(input_excel):
+    # A workbook holds every entity's sheet. CSV/Parquet exports are one file per
+    # sheet, named through an {entity} or {sheet} placeholder such as
+    # "exports/{entity}.parquet".
+    if source_format(input_excel) == "excel":
+        return {entity: input_excel for entity in ENTITY_SHEETS}
+    if "{entity}" not in input_excel and "{sheet}" not in input_excel:
+        raise ValueError(f"{input_excel}: CSV/Parquet inputs need an {{entity}} or {{sheet}} placeholder, "
+                         f"e.g. exports/{{entity}}.csv")
+    return {entity: input_excel.format(entity=entity, sheet=sheet) for entity, sheet in ENTITY_SHEETS.items()}
+
+
+def source_dtypes(columns):
+    return {col: dtype for col, dtype in SOURCE_DTYPES.items() if col in columns}
+
+
+def parquet_columns(path):
+    if pq is None:
+        # Without pyarrow, read_parquet falls back to fastparquet and reads every column.
+        return None
+    return [col for col in pq.read_schema(path).names if is_source_column(col)]
+
+
+def read_source_sheet(path, sheet, xls=None):
+    # Only the needed columns are read, with their dtypes fixed up front.
+    fmt = source_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=is_source_column, dtype=SOURCE_DTYPES)
+    if fmt == "parquet":
+        df = pd.read_parquet(path, columns=parquet_columns(path))
+        return df.astype(source_dtypes(df.columns))
+    return xls.parse(sheet, usecols=is_source_column, dtype=SOURCE_DTYPES)
+
+
+def iter_source_chunks(path, sheet, chunksize):
+    fmt = source_format(path)
+    if fmt == "csv":
+        yield from pd.read_csv(path, usecols=is_source_column, dtype=SOURCE_DTYPES,
+                               chunksize=chunksize)
+    elif fmt == "parquet" and pq is not None:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=parquet_columns(path)):
+            df = batch.to_pandas()
+            yield df.astype(source_dtypes(df.columns))
+    elif fmt == "parquet":
+        df = read_source_sheet(path, sheet)
+        for start in range(0, max(len(df), 1), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from iter_sheet_chunks(path, sheet, chunksize)
+
+
+def sheet_value(value):
+    # Cell values as read_excel returns them: empty strings are blank, and whole
+    # floats are integers.
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_sheet_chunks(input_excel, sheet, chunksize):
+    # openpyxl's read-only mode streams rows from the file, so memory stays bounded
+    # by the chunk size. calamine is faster but loads the whole sheet, every
+    # column included, before handing over the first row.
+    workbook = openpyxl.load_workbook(input_excel, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        missing = [col for col in COLUMNS_TO_KEEP if col not in header]
+        if missing:
+            raise KeyError(f"{sheet} is missing columns: {missing}")
+        kept = COLUMNS_TO_KEEP + [gap_column(header)]
+        columns = kept + list(present_dimensions(header))
+        positions = [header.index(col) for col in columns]
+
+        batch = []
+        yielded = False
+        for row in rows:
+            values = [sheet_value(row[i]) if i < len(row) else None for i in positions]
+            if all(v is None for v in values[:len(kept)]):
+                continue
+            batch.append(values)
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=columns).astype(source_dtypes(columns))
+                yielded = True
+                batch = []
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=columns).astype(source_dtypes(columns))
+    finally:
+        workbook.close()
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_digest(input_excel):
+    paths = sorted(set(source_paths(input_excel).values()))
+    if len(paths) == 1:
+        return file_digest(paths[0])
+    return hashlib.sha256("".join(file_digest(path) for path in paths).encode()).hexdigest()
+
+
+def build_output_key(workbook_digest, payload_format, shard_dir=None, shard_page_sizes=SHARD_PAGE_SIZES,
+                     bundle=False):
+    # The template lives in this file, so its digest covers template changes too.
+    key = {
+        "workbook": workbook_digest,
+        "generator": file_digest(__file__),
+        "payload_format": payload_format,
+        "shard_dir": shard_dir,
+        "shard_page_sizes": list(shard_page_sizes) if shard_dir else None,
+        "bundle": bundle,
+        "cache_version": CACHE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_output_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "outputs.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def shard_digest(output_html, shard_dir):
+    # Digest over every file under the page's shard directory, names included, so
+    # deleted, edited or extra shard files all change it.
+    if shard_dir is None:
+        return None
+    shard_root = os.path.join(os.path.dirname(os.path.abspath(output_html)), shard_dir)
+    h = hashlib.sha256()
+    for path in sorted(iter_files(shard_root)):
+        h.update(os.path.relpath(path, shard_root).replace(os.sep, "/").encode("utf-8") + b"\0")
+        h.update(file_digest(path).encode("ascii"))
+    return h.hexdigest()
+
+
+def output_is_current(cache_dir, output_html, output_key, shard_dir=None):
+    entry = read_output_manifest(cache_dir).get(os.path.abspath(output_html))
+    if entry is None or entry["key"] != output_key or not os.path.exists(output_html):
+        return False
+    return (file_digest(output_html) == entry["digest"]
+            and shard_digest(output_html, shard_dir) == entry.get("shards"))
+
+
+def record_output(cache_dir, output_html, output_key, shard_dir=None):
+    manifest = read_output_manifest(cache_dir)
+    manifest[os.path.abspath(output_html)] = {
+        "key": output_key,
+        "digest": file_digest(output_html),
+        "shards": shard_digest(output_html, shard_dir),
+    }
+    with open(os.path.join(cache_dir, "outputs.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def load_prepared_sheets(input_excel, cache_dir=None, workbook_digest=None, read_chunksize=None):
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        if workbook_digest is None:
+            workbook_digest = source_digest(input_excel)
+
+    paths = source_paths(input_excel)
+    xls = None
+    frames = {}
+    for entity, sheet in ENTITY_SHEETS.items():
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, f"{workbook_digest}-{sheet}-v{CACHE_VERSION}.pkl")
+            if os.path.exists(cache_path):
+                with profile_stage("cache read"):
+                    frames[entity] = pd.read_pickle(cache_path)
+                continue
+
+        if read_chunksize:
+            chunks = profile_iter("load", iter_source_chunks(paths[entity], sheet, read_chunksize))
+            df = prepare_sheet_chunks(chunks)
+        else:
+            with profile_stage("load"):
+                # Only open the workbook when at least one sheet is missing from the cache.
+                if xls is None and source_format(paths[entity]) == "excel":
+                    xls = pd.ExcelFile(paths[entity], engine=EXCEL_ENGINE)
+                raw = read_source_sheet(paths[entity], sheet, xls)
+            df = prepare_sheet(raw)
+        if cache_path is not None:
+            with profile_stage("cache write"):
+                df.to_pickle(cache_path)
+        frames[entity] = df
+
+    # Names are disambiguated across entities, so this runs after the cache too.
+    with profile_stage("disambiguation"):
+        return disambiguate_names(frames)
+
+
+def columnar_table(df):
+    # One column per payload field; money and enrollment are stored once as
+    # integers and formatted client-side.
+    return pd.DataFrame({
+        "number": df["District Number"],
+        "name": df["District Name"],
+        "enrollment": df["Enrollment"].astype(int),
+        "spent": df["SPED District Expenditure (GF)"].astype(int),
+        "received": df["SPED State Funding"].astype(int),
+        "gap": df["SPED Funding Gap"].astype(int),
+    }).reset_index(drop=True)
+
+
+def build_records_payload(df):
+    # Legacy row-dict layout: formatted display strings plus the raw numbers.
+    records = df[list(COLUMN_RENAME.values()) + ["SPED Funding Gap"]].copy()
+    records["District Number"] = "'" + padded_ids(df["District Number"])
+    with profile_stage("formatting"):
+        records["Enrollment"] = format_enrollment_series(df["Enrollment"])
+        for col in MONEY_COLUMNS:
+            records[col] = format_currency_series(df[col])
+    records["SPED Funding Gap Raw"] = df["SPED Funding Gap"]
+    records["Spent"] = df["SPED District Expenditure (GF)"]
+    records["Received"] = df["SPED State Funding"]
+    return records.to_dict(orient="records")
+
+
+def json_items(values):
+    # Comma-separated JSON for a list, without the surrounding brackets. Escaping
+    # "</" keeps the text safe inside a <script type="application/json"> block.
+    return json.dumps(values, separators=(",", ":"))[1:-1].replace("</", "<\\/")
+
+
+def iter_json_array(chunks):
+    yield "["
+    for i, chunk in enumerate(chunks):
+        yield ("," if i else "") + json_items(chunk)
+    yield "]"
+
+
+def shard_table(df):
+    # Rows in the client's layout: the five table columns, then the district number.
+    return columnar_table(df)[ORDER_KEYS + ["number"]]
 
-    districts_sorted = disambiguate_names(districts_sorted)
-    charters_sorted = disambiguate_names(charters_sorted)
 
-    # Add numeric columns for charting (Spent and Received)
-    districts_sorted["Spent"] = districts_sorted["SPED District Expenditure (GF)"].apply(
-        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+def iter_sort_orders(df):
+    # Ascending row order of every table column (and the district number) by its
+    # raw value; the client walks these backwards for descending sorts instead of
+    # sorting on each draw. Orders stay integer arrays until serialized.
+    table = shard_table(df)
+    for key in ORDER_KEYS + ["number"]:
+        yield key, table[key].argsort(kind="stable").to_numpy()
+
+
+def build_sort_orders(df):
+    return {key: order.tolist() for key, order in iter_sort_orders(df)}
+
+
+def name_tokens(names):
+    # Lower-cased word tokens of each name, one per row, indexed by row position.
+    text = names.str.lower().reset_index(drop=True)
+    if pq is None:
+        return text.str.findall(r"[^\W_]+").explode().dropna()
+    # Arrow's string kernels keep the tokens out of the Python heap; [^\pL\pN] is
+    # its spelling of [\W_].
+    text = text.astype(pd.ArrowDtype(pyarrow.string()))
+    tokens = text.str.replace(r"[^\pL\pN]+", " ", regex=True).str.strip().str.split(" ").explode()
+    return tokens[tokens.fillna("") != ""]
+
+
+def search_postings(df):
+    # Word-prefix index over district names: the sorted distinct tokens, and the
+    # payload rows containing each token as one flat row array with the offset of
+    # each token's run. District number prefixes are found by binary search over
+    # the "number" sort order instead.
+    tokens = name_tokens(df["District Name"])
+    pairs = (pd.DataFrame({"token": tokens.array, "row": tokens.index})
+             .drop_duplicates()
+             .sort_values(["token", "row"]))
+    first = ~pairs["token"].duplicated()
+    offsets = first.to_numpy().nonzero()[0].tolist() + [len(pairs)]
+    return pairs["token"][first].to_numpy(), pairs["row"].to_numpy(), offsets
+
+
+def iter_search_index(df, chunksize=PAYLOAD_CHUNK_ROWS):
+    tokens, rows, offsets = search_postings(df)
+    spans = [(start, min(start + chunksize, len(tokens))) for start in range(0, len(tokens), chunksize)]
+    yield '{"tokens":'
+    yield from iter_json_array(tokens[start:end].tolist() for start, end in spans)
+    yield ',"postings":'
+    yield from iter_json_array(
+        [rows[offsets[i]:offsets[i + 1]].tolist() for i in range(start, end)] for start, end in spans
     )
-    districts_sorted["Received"] = districts_sorted["SPED State Funding"].apply(
-        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+    yield "}"
+
+
+def iter_payload_json(df, payload_format, chunksize=PAYLOAD_CHUNK_ROWS):
+    # Every part of the payload, the indexes included, is serialized a chunk of
+    # rows at a time so no full-size Python list is ever built.
+    starts = range(0, len(df), chunksize)
+    if payload_format == "records":
+        yield from iter_json_array(build_records_payload(df.iloc[start:start + chunksize]) for start in starts)
+        return
+
+    table = columnar_table(df)
+    yield "{"
+    for field_index, (field, values) in enumerate(table.items()):
+        yield ("," if field_index else "") + json.dumps(field) + ":"
+        yield from iter_json_array(values.iloc[start:start + chunksize].tolist() for start in starts)
+
+    # Precomputed indexes let the page sort and search without touching every row.
+    yield ',"orders":{'
+    for key_index, (key, order) in enumerate(iter_sort_orders(df)):
+        yield ("," if key_index else "") + json.dumps(key) + ":"
+        yield from iter_json_array(order[start:start + chunksize].tolist() for start in starts)
+    yield '},"search":'
+    yield from iter_search_index(df, chunksize)
+    yield "}"
+
+
+def iter_data_script(element_id, df, payload_format):
+    yield f'<script type="application/json" id="{element_id}">'
+    yield from iter_payload_json(df, payload_format)
+    yield "</script>\n"
+
+
+def write_shards(shard_root, entity, df, page_sizes=SHARD_PAGE_SIZES):
+    entity_dir = os.path.join(shard_root, entity)
+    # Drop shards from a previous build, which may have had more pages.
+    shutil.rmtree(entity_dir, ignore_errors=True)
+
+    table_rows = shard_table(df).values.tolist()
+    orders = build_sort_orders(df)
+    for key in ORDER_KEYS:
+        ascending = orders[key]
+        for direction, order in (("asc", ascending), ("desc", ascending[::-1])):
+            rows = [table_rows[i] for i in order]
+            for page_size in page_sizes:
+                page_dir = os.path.join(entity_dir, f"{key}-{direction}", str(page_size))
+                os.makedirs(page_dir, exist_ok=True)
+                for page, start in enumerate(range(0, max(len(rows), 1), page_size)):
+                    with open(os.path.join(page_dir, f"{page}.json"), "w") as f:
+                        json.dump(rows[start:start + page_size], f, separators=(",", ":"))
+
+    # Full payload with its search index, fetched only when the visitor searches.
+    with open(os.path.join(entity_dir, "all.json"), "w") as f:
+        for piece in iter_payload_json(df, "columnar"):
+            f.write(piece)
+    return {"total": len(df)}
+
+
+def iter_shard_manifest_script(shard_base, page_sizes, entities):
+    manifest = {
+        "base": shard_base,
+        "pageSizes": list(page_sizes),
+        "orderKeys": ORDER_KEYS,
+        "entities": entities,
+    }
+    yield '<script type="application/json" id="shard-manifest">'
+    yield json.dumps(manifest, separators=(",", ":")).replace("</", "<\\/")
+    yield "</script>\n"
+
+
+def print_payload_size_report(label, df, payload_format, chunksize=PAYLOAD_CHUNK_ROWS):
+    # The legacy size is that of repr() over every row dict, summed a chunk at a
+    # time: the brackets, each record and a ", " between records.
+    legacy_size = 2 + 2 * max(len(df) - 1, 0) + sum(
+        len(repr(record).encode("utf-8"))
+        for start in range(0, len(df), chunksize)
+        for record in build_records_payload(df.iloc[start:start + chunksize])
     )
-    charters_sorted["Spent"] = charters_sorted["SPED District Expenditure (GF)"].apply(
-        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+    new_size = sum(len(piece.encode("utf-8")) for piece in iter_payload_json(df, payload_format))
+    saved = (1 - new_size / legacy_size) * 100 if legacy_size else 0
+    print(f"{label} payload: {legacy_size:,} bytes (records) -> {new_size:,} bytes, {saved:.1f}% smaller")
+
+
+def format_currency(val):
+    val = int(val)
+    return f"-${abs(val):,}" if val < 0 else f"${val:,}"
+
+
+def format_enrollment(val):
+    return f"{int(val):,}"
+
+
+def format_thousands(magnitudes):
+    # Non-negative integers as "1,234,567" strings, built with Arrow kernels one
+    # group of three digits at a time instead of one Python call per value.
+    rest, text = pyarrow.array(magnitudes, type=pyarrow.int64()), None
+    while True:
+        higher = pc.divide(rest, 1000)
+        group = pc.cast(pc.subtract(rest, pc.multiply(higher, 1000)), pyarrow.string())
+        group = pc.if_else(pc.greater(higher, 0), pc.utf8_lpad(group, width=3, padding="0"), group)
+        if text is not None:
+            group = pc.if_else(pc.greater(rest, 0), pc.binary_join_element_wise(group, text, ","), text)
+        text, rest = group, higher
+        if not pc.any(pc.greater(rest, 0)).as_py():
+            return text
+
+
+def format_currency_series(values):
+    # Bulk formatting: one integer cast for the whole column, then Arrow string
+    # kernels, or a plain list comprehension (still faster than Series.apply)
+    # without pyarrow.
+    ints = values.astype("int64")
+    if pc is None:
+        return pd.Series([f"-${-v:,}" if v < 0 else f"${v:,}" for v in ints.tolist()], index=values.index)
+    sign = pc.if_else(pyarrow.array(ints.to_numpy() < 0), "-$", "$")
+    text = pc.binary_join_element_wise(sign, format_thousands(ints.abs().to_numpy()), "")
+    return pd.Series(text, index=values.index, dtype=STRING_DTYPE)
+
+
+def format_enrollment_series(values):
+    ints = values.astype("int64")
+    if pc is None:
+        return pd.Series([f"{v:,}" for v in ints.tolist()], index=values.index)
+    return pd.Series(format_thousands(ints.to_numpy()), index=values.index, dtype=STRING_DTYPE)
+
+
+def gap_frame(frames):
+    # Every entity in one frame, with the derived columns the analytics group on.
+    combined = pd.concat([df.assign(Entity=entity) for entity, df in frames.items()], ignore_index=True)
+    enrollment = combined["Enrollment"]
+    combined["Gap per Student"] = combined["SPED Funding Gap"] / enrollment.where(enrollment > 0)
+    combined["Enrollment Band"] = pd.cut(
+        enrollment,
+        bins=[lower for lower, _ in ENROLLMENT_BANDS] + [float("inf")],
+        labels=[label for _, label in ENROLLMENT_BANDS],
+        right=False,
     )
-    charters_sorted["Received"] = charters_sorted["SPED State Funding"].apply(
-        lambda x: float(x.replace("$", "").replace(",", "")) if isinstance(x, str) else float(x)
+    combined["Surplus"] = combined["SPED Funding Gap"] > 0
+    combined["Deficit"] = combined["SPED Funding Gap"] < 0
+    return combined
+
+
+def json_records(df):
+    # NaN (e.g. the per-student gap of a group with no enrollment) becomes null.
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def group_gap_stats(combined, keys):
+    # Counts, totals, percentiles and per-student gap for each group, from one
+    # group-by over the combined frame.
+    grouped = combined.groupby(keys, observed=True, sort=True)
+    stats = grouped.agg(
+        count=("SPED Funding Gap", "size"),
+        surplus_count=("Surplus", "sum"),
+        deficit_count=("Deficit", "sum"),
+        enrollment=("Enrollment", "sum"),
+        spent=("SPED District Expenditure (GF)", "sum"),
+        received=("SPED State Funding", "sum"),
+        net_gap=("SPED Funding Gap", "sum"),
+        median_gap_per_student=("Gap per Student", "median"),
     )
+    quantiles = [p / 100 for p in GAP_PERCENTILES]
+    percentiles = grouped["SPED Funding Gap"].quantile(quantiles).unstack().reindex(columns=quantiles)
+    percentiles.columns = [f"p{p}_gap" for p in GAP_PERCENTILES]
+    stats = stats.join(percentiles)
+
+    counted = stats["surplus_count"] + stats["deficit_count"]
+    stats["surplus_pct"] = (stats["surplus_count"] / counted * 100).where(counted > 0, 0)
+    stats["deficit_pct"] = (stats["deficit_count"] / counted * 100).where(counted > 0, 0)
+    stats["gap_per_student"] = stats["net_gap"] / stats["enrollment"].where(stats["enrollment"] > 0)
+    return json_records(stats.reset_index())
+
+
+def empty_gap_stats(entity):
+    # The stats row of an entity with no rows, e.g. after a batch filter.
+    return {
+        "Entity": entity,
+        "count": 0,
+        "surplus_count": 0,
+        "deficit_count": 0,
+        "enrollment": 0,
+        "spent": 0,
+        "received": 0,
+        "net_gap": 0,
+        "median_gap_per_student": None,
+        **{f"p{p}_gap": None for p in GAP_PERCENTILES},
+        "surplus_pct": 0,
+        "deficit_pct": 0,
+        "gap_per_student": None,
+    }
+
+
+def gap_histogram(combined, entities):
+    # Per-student gap counts per entity over shared bins, so the entities' shapes
+    # are comparable. Bins span the 1st-99th percentile; outliers land in the end
+    # bins.
+    values = combined["Gap per Student"]
+    low, high = values.quantile(0.01), values.quantile(0.99)
+    if pd.isna(low):
+        low = high = 0.0
+    if high <= low:
+        high = low + 1
+    step = (high - low) / HISTOGRAM_BINS
+    edges = [round(float(low + step * i), 2) for i in range(HISTOGRAM_BINS + 1)]
+    bins = ((values.clip(low, high) - low) // step).clip(upper=HISTOGRAM_BINS - 1)
+    counts = combined.assign(Bin=bins).groupby(["Entity", "Bin"]).size()
+    return {
+        "field": "Gap per Student",
+        "edges": edges,
+        "counts": {
+            entity: [int(counts.get((entity, float(i)), 0)) for i in range(HISTOGRAM_BINS)]
+            for entity in entities
+        },
+    }
+
+
+def gap_analytics(frames):
+    # Summary statistics by entity, by entity and enrollment band, and by entity
+    # and each dimension column present, plus the per-student gap histogram.
+    combined = gap_frame(frames)
+    entity_stats = {row["Entity"]: row for row in group_gap_stats(combined, ["Entity"])}
+    groups = {"Entity": [entity_stats.get(entity) or empty_gap_stats(entity) for entity in sorted(frames)]}
+    for column in ["Enrollment Band"] + [col for col in DIMENSION_COLUMNS.values() if col in combined.columns]:
+        if column not in groups:
+            groups[column] = group_gap_stats(combined, ["Entity", column])
+    return {"groups": groups, "histogram": gap_histogram(combined, list(frames))}
+
+
+def load_gap_analytics(frames, cache_dir=None, workbook_digest=None):
+    # Analytics for the full workbook are cached next to its prepared frames.
+    cache_path = None
+    if cache_dir is not None and workbook_digest is not None:
+        cache_path = os.path.join(cache_dir, f"{workbook_digest}-analytics-v{CACHE_VERSION}.json")
+        if os.path.exists(cache_path):
+            with profile_stage("cache read"):
+                with open(cache_path) as f:
+                    return json.load(f)
+
+    with profile_stage("aggregation"):
+        analytics = gap_analytics(frames)
+    if cache_path is not None:
+        with profile_stage("cache write"):
+            with open(cache_path, "w") as f:
+                json.dump(analytics, f)
+    return analytics
+
+
+def page_analytics(analytics):
+    # The part of the analytics the page draws client-side: the histogram, and the
+    # per-student gap by the first of Region or County with few enough groups to
+    # chart. The summary and band tables are rendered into the HTML, and the full
+    # result stays in the analytics cache.
+    embedded = {"histogram": analytics["histogram"]}
+    for dimension in dict.fromkeys(DIMENSION_COLUMNS.values()):
+        rows = analytics["groups"].get(dimension)
+        if rows and len({row[dimension] for row in rows}) <= CHART_MAX_BARS:
+            embedded["dimension"] = {
+                "name": dimension,
+                "rows": [{key: row[key] for key in ("Entity", dimension, "gap_per_student")} for row in rows],
+            }
+            break
+    return embedded
 
-    districts_surplus_count = (districts_sorted["SPED Funding Gap Raw"] > 0).sum()
-    districts_deficit_count = (districts_sorted["SPED Funding Gap Raw"] < 0).sum()
-    charters_surplus_count = (charters_sorted["SPED Funding Gap Raw"] > 0).sum()
-    charters_deficit_count = (charters_sorted["SPED Funding Gap Raw"] < 0).sum()
 
-    districts_surplus_total = districts_sorted.loc[districts_sorted["SPED Funding Gap Raw"] > 0, "SPED Funding Gap Raw"].sum()
-    districts_deficit_total = districts_sorted.loc[districts_sorted["SPED Funding Gap Raw"] < 0, "SPED Funding Gap Raw"].sum()
-    charters_surplus_total = charters_sorted.loc[charters_sorted["SPED Funding Gap Raw"] > 0, "SPED Funding Gap Raw"].sum()
-    charters_deficit_total = charters_sorted.loc[charters_sorted["SPED Funding Gap Raw"] < 0, "SPED Funding Gap Raw"].sum()
+def iter_analytics_script(analytics):
+    yield '<script type="application/json" id="gap-analytics">'
+    yield json.dumps(page_analytics(analytics), separators=(",", ":")).replace("</", "<\\/")
+    yield "</script>\n"
 
-    districts_net_gap = districts_surplus_total + districts_deficit_total
-    charters_net_gap = charters_surplus_total + charters_deficit_total
-    total_net_gap = districts_net_gap + charters_net_gap
 
-    districts_surplus_pct = (districts_surplus_count / (districts_surplus_count + districts_deficit_count) * 100) if (districts_surplus_count + districts_deficit_count) > 0 else 0
-    districts_deficit_pct = (districts_deficit_count / (districts_surplus_count + districts_deficit_count) * 100) if (districts_surplus_count + districts_deficit_count) > 0 else 0
-    charters_surplus_pct = (charters_surplus_count / (charters_surplus_count + charters_deficit_count) * 100) if (charters_surplus_count + charters_deficit_count) > 0 else 0
-    charters_deficit_pct = (charters_deficit_count / (charters_surplus_count + charters_deficit_count) * 100) if (charters_surplus_count + charters_deficit_count) > 0 else 0
+def entity_summary_html(entity, stats):
+    return "\n".join([
+        f"        <li><strong>{ENTITY_LABELS[entity]}</strong>",
+        "          <ul>",
+        f"            <li>With deficit: {stats['deficit_count']} ({stats['deficit_pct']:.1f}%)</li>",
+        f"            <li>No deficit: {stats['surplus_count']} ({stats['surplus_pct']:.1f}%)</li>",
+        f"            <li>Net Funding Gap: {format_currency(stats['net_gap'])}</li>",
+        f"            <li>Net Funding Gap per Student: {format_money_or_na(stats['gap_per_student'])}</li>",
+        f"            <li>Median Funding Gap: {format_money_or_na(stats['p50_gap'])} "
+        f"(middle 50%: {format_money_or_na(stats['p25_gap'])} to {format_money_or_na(stats['p75_gap'])})</li>",
+        "          </ul>",
+        "        </li>",
+        "        <br/>",
+    ])
 
-    def format_currency(val):
-        val = int(val)
-        return f"-${abs(val):,}" if val < 0 else f"${val:,}"
 
-    def format_enrollment(val):
-        return f"{int(val):,}"
+def format_money_or_na(val):
+    return "n/a" if val is None else format_currency(val)
 
-    for df in [districts_sorted, charters_sorted]:
-        df["Enrollment"] = df["Enrollment"].apply(format_enrollment)
-        for col in ["SPED District Expenditure (GF)", "SPED State Funding", "SPED Funding Gap"]:
-            df[col] = df[col].apply(format_currency)
 
-    districts_json = districts_sorted.to_dict(orient="records")
-    charters_json = charters_sorted.to_dict(orient="records")
+def band_table_html(analytics, entities):
+    # An entity with no rows gets one all-zero row instead of disappearing.
+    band_rows = [
+        row
+        for entity in entities
+        for row in [row for row in analytics["groups"]["Enrollment Band"] if row["Entity"] == entity]
+        or [{**empty_gap_stats(entity), "Enrollment Band": "n/a"}]
+    ]
+    rows = [
+        "        <tr>"
+        f"<td>{ENTITY_LABELS[row['Entity']]}</td>"
+        f"<td>{row['Enrollment Band']}</td>"
+        f"<td>{row['count']}</td>"
+        f"<td>{row['deficit_count']} ({row['deficit_pct']:.1f}%)</td>"
+        f"<td>{format_currency(row['net_gap'])}</td>"
+        f"<td>{format_money_or_na(row['gap_per_student'])}</td>"
+        f"<td>{format_money_or_na(row['p50_gap'])}</td>"
+        "</tr>"
+        for row in band_rows
+    ]
+    return "\n".join([
+        '    <h3 style="margin-top: 30px;">Funding Gap by Enrollment</h3>',
+        '    <table class="band-stats">',
+        "        <tr><th>Type</th><th>Enrollment</th><th>Count</th><th>With deficit</th>"
+        "<th>Net Funding Gap</th><th>Per Student</th><th>Median Gap</th></tr>",
+        *rows,
+        "    </table>",
+        '    <div id="gap-distribution-chart-container" style="margin-bottom: 20px;"></div>',
+        '    <div id="gap-dimension-chart-container" style="margin-bottom: 20px;"></div>',
+    ])
+
+
+def entity_section_html(entity):
+    return "\n".join([
+        '    <div style="border: 1px solid lightgrey; border-radius: 4px; padding: 15px; margin-top: 30px;">    ',
+        "        <!-- The chart title is now set via Chart.js, so no h2 here -->",
+        f"        <!-- Chart container for {ENTITY_LABELS[entity]} -->",
+        f'        <div id="{entity}-chart-container" style="margin-bottom: 20px;"></div>',
+        '        <div class="table-container">',
+        f'            <div id="{entity}-table-container"></div>',
+        "        </div>",
+        "    </div>",
+        "",
+    ])
+
+
+@contextlib.contextmanager
+def profiling(profile, input_excel, output_html):
+    global ACTIVE_PROFILER
+    if not profile:
+        yield
+        return
+
+    ACTIVE_PROFILER = StageProfiler()
+    profiler = cProfile.Profile() if profile == "cprofile" else None
+    tracemalloc.start()
+    try:
+        with profile_stage("total"):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        report = ACTIVE_PROFILER.report(input=os.path.abspath(input_excel), output=os.path.abspath(output_html))
+    finally:
+        ACTIVE_PROFILER = None
+        tracemalloc.stop()
+
+    report_base = os.path.splitext(output_html)[0]
+    with open(report_base + ".profile.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote stage profile to {report_base}.profile.json")
+    if profiler is not None:
+        profiler.dump_stats(report_base + ".prof")
+        print(f"Wrote cProfile stats to {report_base}.prof")
+
+
+def cdn_asset_tags():
+    return {
+        name: f'<link rel="stylesheet" href="{url}"/>' if url.endswith(".css") else f'<script src="{url}"></script>'
+        for name, (url, _) in VENDOR_ASSETS.items()
+    }
+
+
+def vendor_assets(vendor_root, fetch=False):
+    # Local copies of VENDOR_ASSETS. Missing files are downloaded only when fetch
+    # is set; after that, builds need no network.
+    paths, missing = {}, []
+    for name, (url, filename) in VENDOR_ASSETS.items():
+        path = os.path.join(vendor_root, filename)
+        if not os.path.exists(path):
+            if not fetch:
+                missing.append(path)
+                continue
+            os.makedirs(vendor_root, exist_ok=True)
+            with urllib.request.urlopen(url, timeout=60) as response, open(path + ".tmp", "wb") as f:
+                shutil.copyfileobj(response, f)
+            os.replace(path + ".tmp", path)
+            print(f"Vendored {url} -> {path}")
+        paths[name] = path
+    if missing:
+        raise FileNotFoundError(f"Vendored assets missing: {missing}. Run with --fetch-assets once "
+                                f"(or copy them in from a machine that can reach the CDNs).")
+    return paths
+
+
+def vendored_asset_tags(paths, page_dir):
+    # Stylesheets without url() references are inlined, saving a blocking request;
+    # scripts point at the vendored files next to the page.
+    tags = {}
+    for name, path in paths.items():
+        href = os.path.relpath(path, page_dir).replace(os.sep, "/")
+        if path.endswith(".css"):
+            with open(path) as f:
+                css = f.read()
+            # One line, so the template's dedent still sees its own indentation.
+            tags[name] = (f"<style>{' '.join(css.split())}</style>" if "url(" not in css
+                          else f'<link rel="stylesheet" href="{href}"/>')
+        else:
+            tags[name] = f'<script src="{href}"></script>'
+    return tags
+
+
+def minify_markup(text):
+    # Drops indentation, blank lines and whole-line comments. Line breaks are kept
+    # so JavaScript semicolon insertion is unaffected; the template has no <pre>
+    # blocks or multi-line template literals that would notice.
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("//") or (line.startswith("/*") and line.endswith("*/")):
+            continue
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def precompress_file(path):
+    # Writes path.gz (and path.br when brotli is installed) alongside the file in
+    # one streaming pass, and returns its integrity manifest entry. mtime=0 keeps
+    # the .gz output reproducible.
+    digest = hashlib.sha384()
+    size = 0
+    compressor = brotli.Compressor(quality=11) if brotli is not None else None
+    with contextlib.ExitStack() as stack:
+        src = stack.enter_context(open(path, "rb"))
+        gz = stack.enter_context(gzip.GzipFile(path + ".gz", "wb", compresslevel=9, mtime=0))
+        br = stack.enter_context(open(path + ".br", "wb")) if compressor is not None else None
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            digest.update(chunk)
+            size += len(chunk)
+            gz.write(chunk)
+            if br is not None:
+                br.write(compressor.process(chunk))
+        if br is not None:
+            br.write(compressor.finish())
+    if compressor is None and os.path.exists(path + ".br"):
+        os.remove(path + ".br")
+
+    entry = {"bytes": size, "integrity": "sha384-" + base64.b64encode(digest.digest()).decode("ascii"),
+             "gzip_bytes": os.path.getsize(path + ".gz")}
+    if compressor is not None:
+        entry["br_bytes"] = os.path.getsize(path + ".br")
+    return entry
+
+
+def precompress_site(output_html, artifact_paths):
+    # Precompresses every text artifact of the build and writes
+    # <output>.integrity.json with sizes and SRI-style sha384 digests.
+    page_dir = os.path.dirname(os.path.abspath(output_html))
+    files = {}
+    for path in sorted(set(artifact_paths)):
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            files[os.path.relpath(path, page_dir).replace(os.sep, "/")] = precompress_file(path)
+
+    manifest_path = os.path.splitext(output_html)[0] + ".integrity.json"
+    with open(manifest_path, "w") as f:
+        json.dump({"created": datetime.datetime.now().isoformat(timespec="seconds"), "files": files}, f, indent=2)
+    raw = sum(entry["bytes"] for entry in files.values())
+    gzipped = sum(entry["gzip_bytes"] for entry in files.values())
+    summary = f"{len(files)} files, {raw:,} bytes -> {gzipped:,} gzip"
+    if brotli is not None:
+        summary += f", {sum(entry['br_bytes'] for entry in files.values()):,} brotli"
+    print(f"Precompressed {summary}; wrote {manifest_path}")
+
+
+def iter_files(root):
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            yield os.path.join(directory, filename)
+
+
+def school_year(frames):
+    # Categories survive filtering, so this works even when a frame is empty.
+    years = sorted({year for df in frames.values() for year in df["School Year"].cat.categories})
+    if len(years) != 1:
+        raise ValueError(f"Expected sheets from one school year, found {years}")
+    return years[0]
 
-    html_template = textwrap.dedent(f"""\
+
+def render_masthead(title, heading, tags):
+    # Everything up to the page content: <head> with the shared styles and chart
+    # plugin, then the heading bar with the social/contact links.
+    return textwrap.dedent(f"""\
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
-        <title>SPED Funding Gap (2022-2023)</title>
+        <title>{title}</title>
         <link rel="icon" type="image/png" href="favicon-96x96.png" sizes="96x96" />
         <link rel="icon" type="image/svg+xml" href="favicon.svg" />
         <link rel="shortcut icon" href="favicon.ico" />
         <link rel="apple-touch-icon" sizes="180x180" href="apple-touch-icon.png" />
         <meta name="viewport" content="width=device-width, initial-scale=1">
-        <link rel="stylesheet" href="https://cdn.datatables.net/1.13.4/css/jquery.dataTables.min.css"/>
+        {tags['datatables_css']}
         <style>
             body {{ font-family: Helvetica, sans-serif; margin: 40px auto; padding-left: 40px; padding-right: 40px; max-width: 900px; opacity: 0; transition: opacity 0.4s ease-in; }}
             body.loaded {{
@@ -172,7 +1213,6 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
                 }}
             }}
         </style>
-        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
         <script>
             // Note: changes to the plugin code is not reflected to the chart, because the plugin is loaded at chart construction time and editor changes only trigger an chart.update().
             const plugin = {{
@@ -191,7 +1231,7 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
     <body>
 
     <div style="display: flex; justify-content: space-between; align-items: center;">
-        <h1 style="margin: 0;">2022-2023 Special Education Funding Gap</h1>
+        <h1 style="margin: 0;">{heading}</h1>
         <div class="logo-container" style="padding: 4px; display: flex; justify-content: flex-end; align-items: center;">
             <a href="https://x.com/TxEdInfo" target="_blank" style="text-decoration: none; margin-right: 8px;">
                 <img src="logo-black.png" alt="X.com" width="16" height="16">
@@ -212,8 +1252,27 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
         </div>
     </div>
 
+    """)
+
+
+def render_page_shell(frames, analytics, tags=None, minify=False):
+    # The page around the data payloads: everything before and after them. tags
+    # overrides the third-party script/stylesheet tags (see vendored_asset_tags).
+    tags = tags or cdn_asset_tags()
+    year = school_year(frames)
+    start_year, end_year = (int(part) for part in year.split("-"))
+    next_year = f"{end_year}-{end_year + 1}"
+    stats = {row["Entity"]: row for row in analytics["groups"]["Entity"]}
+    total_net_gap = sum(row["net_gap"] for row in stats.values())
+    summary_items = "\n".join(entity_summary_html(entity, stats[entity]) for entity in frames)
+    band_section = band_table_html(analytics, frames)
+    table_sections = "\n".join(entity_section_html(entity) for entity in frames)
+    render_calls = "\n".join(f"        renderDataTable('{entity}', '{entity}-table-container');" for entity in frames)
+
+    page_head = render_masthead(f"SPED Funding Gap ({year})", f"{year} Special Education Funding Gap", tags)
+    page_head += textwrap.dedent(f"""\
     <p>
-        The following analysis reflects the special education (SPED) funding gap for Texas public school districts and charter schools for the 2022-2023 school year using the latest final data publicly available from the Texas Education Agency (see below for citations). The final data for the 2023-2024 school year will be available in Spring 2025 and this analysis will be updated at that time.
+        The following analysis reflects the special education (SPED) funding gap for Texas public school districts and charter schools for the {year} school year using the latest final data publicly available from the Texas Education Agency (see below for citations). The final data for the {next_year} school year will be available in Spring {end_year + 2} and this analysis will be updated at that time.
     </p>
     <p>
         The SPED funding gap reflects the difference between what districts spend on SPED (GF Students with Disabilities-PICs 23,33,43) and the funding they receive from the state (23-Special Education Adjusted Allotment 48.102).
@@ -224,76 +1283,325 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
 
     <h3 style="margin-top: 30px;">Summary Statistics</h3>
     <ul class="summary-stats">
-        <li><strong>Districts</strong>
-          <ul>
-            <li>With deficit: {districts_deficit_count} ({districts_deficit_pct:.1f}%)</li>
-            <li>No deficit: {districts_surplus_count} ({districts_surplus_pct:.1f}%)</li>
-            <li>Net Funding Gap: {"-$" + format(abs(int(districts_net_gap)), ',') if districts_net_gap < 0 else "$" + format(int(districts_net_gap), ',')}</li>
-          </ul>
-        </li>
-        <br/>
-        <li><strong>Charters</strong>
-          <ul>
-            <li>With deficit: {charters_deficit_count} ({charters_deficit_pct:.1f}%)</li>
-            <li>No deficit: {charters_surplus_count} ({charters_surplus_pct:.1f}%)</li>
-            <li>Net Funding Gap: {"-$" + format(abs(int(charters_net_gap)), ',') if charters_net_gap < 0 else "$" + format(int(charters_net_gap), ',')}</li>
-          </ul>
-        </li>
-        <br/>
-        <li><strong>Total Net Funding Gap:</strong> <span style="background-color:#f8d7da;">{"-$" + format(abs(int(total_net_gap)), ',') if total_net_gap < 0 else "$" + format(int(total_net_gap), ',')}</span></li>
+{summary_items}
+        <li><strong>Total Net Funding Gap:</strong> <span style="background-color:#f8d7da;">{format_currency(total_net_gap)}</span></li>
     </ul>
 
-    <div style="border: 1px solid lightgrey; border-radius: 4px; padding: 15px; margin-top: 30px;">    
-        <!-- The chart title is now set via Chart.js, so no h2 here -->
-        <!-- Chart container for Districts -->
-        <div id="districts-chart-container" style="margin-bottom: 20px;"></div>
-        <div class="table-container">
-            <div id="districts-table-container"></div>
-        </div>
-    </div>
-
-    <div style="border: 1px solid lightgrey; border-radius: 4px; padding: 15px; margin-top: 30px;">    
-        <!-- The chart title is now set via Chart.js, so no h2 here -->
-        <!-- Chart container for Charters -->
-        <div id="charters-chart-container" style="margin-bottom: 20px;"></div>
-        <div class="table-container">
-            <div id="charters-table-container"></div>
-        </div>
-    </div>
+{band_section}
 
+{table_sections}
     <h3 style="margin-top: 30px;">Sources of data:</h3>
     <p>
         <ul>
-            <li>District expenditures: <a href="https://rptsvr1.tea.texas.gov/school.finance/forecasting/financial_reports/2223_FinActRep.html" target="_blank">2022-2023 PEIMS Financial Standard Reports,</a> GF Students with Disabilities (PICs 23,33,43)</li>
-            <li>State funding: <a href="https://tealprod.tea.state.tx.us/fsp/Reports/ReportSelection.aspx" target="_blank">2022-2033 Summary of Finances,</a> 23-Special Education Adjusted Allotment 48.102</li>
+            <li>District expenditures: <a href="https://rptsvr1.tea.texas.gov/school.finance/forecasting/financial_reports/{start_year % 100:02d}{end_year % 100:02d}_FinActRep.html" target="_blank">{year} PEIMS Financial Standard Reports,</a> GF Students with Disabilities (PICs 23,33,43)</li>
+            <li>State funding: <a href="https://tealprod.tea.state.tx.us/fsp/Reports/ReportSelection.aspx" target="_blank">{year} Summary of Finances,</a> 23-Special Education Adjusted Allotment 48.102</li>
         </ul>
     </p>
 
-    <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-    <script src="https://cdn.datatables.net/1.13.4/js/jquery.dataTables.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+    {tags['jquery']}
+    {tags['datatables']}
+    {tags['chartjs']}
 
+    """)
+
+    page_tail = textwrap.dedent(f"""\
     <script>
-        function renderDataTable(data, containerId) {{
-            const tableId = containerId + '-table';
-            // Build columns definition based on data keys
-            let columns = [];
-            for (let key in data[0]) {{
-                if (key === "Spent" || key === "Received") {{
-                    columns.push({{ title: key, data: key, visible: false }});
-                }} else if (key !== "District Number" && key !== "SPED Funding Gap Raw") {{
-                    columns.push({{ title: key, data: key }});
+        const ORDER_KEYS = {json.dumps(ORDER_KEYS)};
+        const SCHOOL_YEAR = {json.dumps(year)};
+        const CHART_MAX_BARS = {CHART_MAX_BARS};
+        const numberFormat = new Intl.NumberFormat('en-US');
+
+        function formatCurrency(value) {{
+            return value < 0 ? '-$' + numberFormat.format(-value) : '$' + numberFormat.format(value);
+        }}
+
+        // Row layout: [name, enrollment, spent, received, gap, district number]
+        function payloadToRows(payload) {{
+            if (Array.isArray(payload)) {{
+                return payload.map(r => [
+                    r["District Name"],
+                    parseInt(r["Enrollment"].replace(/,/g, ""), 10),
+                    r["Spent"],
+                    r["Received"],
+                    r["SPED Funding Gap Raw"],
+                    parseInt(r["District Number"].replace("'", ""), 10)
+                ]);
+            }}
+            let rows = new Array(payload.name.length);
+            for (let i = 0; i < rows.length; i++) {{
+                rows[i] = [
+                    payload.name[i],
+                    payload.enrollment[i],
+                    payload.spent[i],
+                    payload.received[i],
+                    payload.gap[i],
+                    payload.number[i]
+                ];
+            }}
+            return rows;
+        }}
+
+        function renderNumber(formatter) {{
+            return function(value, type) {{
+                return type === 'display' || type === 'filter' ? formatter(value) : value;
+            }};
+        }}
+
+        // Rows whose name has a word starting with each query term, or whose
+        // district number starts with it, from the build-time indexes. Returns
+        // null when the query is empty.
+        function searchRows(payload, query) {{
+            const terms = query.toLowerCase().split(/[^\\p{{L}}\\p{{N}}]+/u).filter(Boolean);
+            if (!terms.length) {{
+                return null;
+            }}
+            const tokens = payload.search.tokens;
+            const byNumber = payload.orders.number;
+            const paddedNumber = i => String(payload.number[byNumber[i]]).padStart(6, '0');
+            const n = payload.name.length;
+            let flags = null;
+            for (const term of terms) {{
+                const hits = new Uint8Array(n);
+                let lo = 0, hi = tokens.length;
+                while (lo < hi) {{
+                    const mid = (lo + hi) >> 1;
+                    if (tokens[mid] < term) lo = mid + 1; else hi = mid;
+                }}
+                for (let t = lo; t < tokens.length && tokens[t].startsWith(term); t++) {{
+                    for (const row of payload.search.postings[t]) hits[row] = 1;
+                }}
+                if (/^\\d+$/.test(term)) {{
+                    lo = 0; hi = n;
+                    while (lo < hi) {{
+                        const mid = (lo + hi) >> 1;
+                        if (paddedNumber(mid) < term) lo = mid + 1; else hi = mid;
+                    }}
+                    for (let i = lo; i < n && paddedNumber(i).startsWith(term); i++) hits[byNumber[i]] = 1;
+                }}
+                if (flags) {{
+                    for (let row = 0; row < n; row++) flags[row] &= hits[row];
+                }} else {{
+                    flags = hits;
                 }}
             }}
-            let html = `<table id="${{tableId}}" class="display"></table>`;
-            document.getElementById(containerId).innerHTML = html;
-            let dt = new DataTable(`#${{tableId}}`, {{
-                data: data,
+            let count = 0;
+            for (let row = 0; row < n; row++) count += flags[row];
+            return {{ flags: flags, count: count }};
+        }}
+
+        // DataTables ajax hook over an in-memory payload: pages are read off the
+        // precomputed sort orders and search index, so a draw never re-sorts.
+        function localSource(payload) {{
+            const rows = payloadToRows(payload);
+            let lastQuery = '';
+            let lastMatches = null;
+            return function(request, callback) {{
+                const order = request.order.length ? request.order[0] : {{ column: 4, dir: 'asc' }};
+                const ascending = payload.orders[ORDER_KEYS[order.column]];
+                const query = request.search.value.trim();
+                if (query !== lastQuery) {{
+                    lastQuery = query;
+                    lastMatches = searchRows(payload, query);
+                }}
+                const matches = lastMatches;
+                const filtered = matches ? matches.count : rows.length;
+                const length = request.length < 0 ? filtered : request.length;
+                const page = [];
+                let seen = 0;
+                for (let i = 0; i < ascending.length && page.length < length; i++) {{
+                    const row = ascending[order.dir === 'desc' ? ascending.length - 1 - i : i];
+                    if (matches && !matches.flags[row]) continue;
+                    if (seen++ >= request.start) page.push(rows[row]);
+                }}
+                callback({{
+                    draw: request.draw,
+                    recordsTotal: rows.length,
+                    recordsFiltered: filtered,
+                    data: page
+                }});
+            }};
+        }}
+
+        // DataTables ajax hook that pages through pre-sorted JSON shards written by
+        // gen_html.py, so only the visible page is downloaded and parsed.
+        function shardSource(entity, manifest) {{
+            const info = manifest.entities[entity];
+            const responses = {{}};
+            let searchSource = null;
+
+            function fetchJson(url) {{
+                if (!responses[url]) {{
+                    responses[url] = fetch(url).then(response => {{
+                        if (!response.ok) {{
+                            throw new Error(url + ': HTTP ' + response.status);
+                        }}
+                        return response.json();
+                    }});
+                }}
+                return responses[url];
+            }}
+
+            return function(request, callback) {{
+                const order = request.order.length ? request.order[0] : {{ column: 4, dir: 'asc' }};
+                const search = request.search.value.trim();
+
+                if (!search && manifest.pageSizes.includes(request.length) && request.start % request.length === 0) {{
+                    const page = request.start / request.length;
+                    const key = manifest.orderKeys[order.column] + '-' + order.dir;
+                    fetchJson(`${{manifest.base}}/${{entity}}/${{key}}/${{request.length}}/${{page}}.json`)
+                        .then(rows => callback({{
+                            draw: request.draw,
+                            recordsTotal: info.total,
+                            recordsFiltered: info.total,
+                            data: rows
+                        }}));
+                    return;
+                }}
+
+                // Searching needs the full payload and its index, fetched once.
+                fetchJson(`${{manifest.base}}/${{entity}}/all.json`).then(payload => {{
+                    searchSource = searchSource || localSource(payload);
+                    searchSource(request, callback);
+                }});
+            }};
+        }}
+
+        // Bars for the rows on the current page. Long pages ("100" or "All") are
+        // grouped into at most CHART_MAX_BARS bars of consecutive rows, each showing
+        // the group's averages, so the chart costs the same at any page length.
+        function chartSeries(rows) {{
+            const series = {{ labels: [], spent: [], received: [], grouped: rows.length > CHART_MAX_BARS }};
+            const size = Math.ceil(rows.length / CHART_MAX_BARS);
+            for (let i = 0; i < rows.length; i += series.grouped ? size : 1) {{
+                const group = series.grouped ? rows.slice(i, i + size) : [rows[i]];
+                let spent = 0, received = 0;
+                for (const row of group) {{
+                    spent += row[2];
+                    received += row[3];
+                }}
+                series.labels.push(group.length > 1 ? group[0][0] + ' … ' + group[group.length - 1][0] : group[0][0]);
+                series.spent.push(Math.round(spent / group.length));
+                series.received.push(Math.round(received / group.length));
+            }}
+            return series;
+        }}
+
+        function renderAnalyticsChart(containerId, title, labels, datasets, money) {{
+            const container = document.getElementById(containerId);
+            const canvas = document.createElement('canvas');
+            canvas.style.maxHeight = '300px';
+            canvas.style.minHeight = '300px';
+            container.appendChild(canvas);
+            return new Chart(canvas.getContext('2d'), {{
+                type: 'bar',
+                plugins: [plugin],
+                data: {{ labels: labels, datasets: datasets }},
+                options: {{
+                    maintainAspectRatio: false,
+                    animation: false,
+                    scales: {{
+                        y: {{
+                            ticks: {{
+                                callback: value => money ? formatCurrency(value) : value
+                            }}
+                        }}
+                    }},
+                    plugins: {{
+                        customCanvasBackgroundColor: {{
+                            color: 'white',
+                        }},
+                        title: {{
+                            display: true,
+                            text: title,
+                            color: 'black',
+                            font: {{
+                                size: 16
+                            }}
+                        }},
+                        legend: {{
+                            display: true,
+                            labels: {{
+                                boxWidth: 12
+                            }}
+                        }},
+                    }},
+                }}
+            }});
+        }}
+
+        // Charts over the build-time analytics (gap_analytics in gen_html.py): the
+        // per-student gap histogram, and per-student gap by Region or County when
+        // the data has that dimension with few enough groups to chart.
+        function renderAnalyticsCharts() {{
+            const analytics = JSON.parse(document.getElementById('gap-analytics').textContent);
+            const entityLabels = {json.dumps(ENTITY_LABELS)};
+            const colors = {{ districts: 'darkred', charters: 'lightcoral' }};
+            const entities = Object.keys(analytics.histogram.counts);
+
+            const edges = analytics.histogram.edges;
+            const binLabels = edges.slice(0, -1).map((edge, i) =>
+                formatCurrency(Math.round(edge)) + ' to ' + formatCurrency(Math.round(edges[i + 1])));
+            renderAnalyticsChart('gap-distribution-chart-container', 'Funding Gap per Student (number of LEAs)', binLabels,
+                entities.map(entity => ({{
+                    label: entityLabels[entity],
+                    data: analytics.histogram.counts[entity],
+                    backgroundColor: colors[entity]
+                }})), false);
+
+            // Only a dimension with few enough groups to chart is embedded.
+            if (analytics.dimension) {{
+                const dimension = analytics.dimension.name;
+                const rows = analytics.dimension.rows;
+                const keys = [...new Set(rows.map(row => row[dimension]))].sort((a, b) => a < b ? -1 : a > b ? 1 : 0);
+                renderAnalyticsChart('gap-dimension-chart-container', 'Net Funding Gap per Student by ' + dimension,
+                    keys.map(String), entities.map(entity => ({{
+                        label: entityLabels[entity],
+                        data: keys.map(key => {{
+                            const row = rows.find(row => row.Entity === entity && row[dimension] === key);
+                            return row ? row.gap_per_student : null;
+                        }}),
+                        backgroundColor: colors[entity]
+                    }})), true);
+            }}
+        }}
+
+        function renderDataTable(entity, containerId) {{
+            const tableId = containerId + '-table';
+            let columns = [
+                {{ title: "District Name", data: 0 }},
+                {{ title: "Enrollment", data: 1, render: renderNumber(v => numberFormat.format(v)) }},
+                {{ title: "SPED District Expenditure (GF)", data: 2, render: renderNumber(formatCurrency) }},
+                {{ title: "SPED State Funding", data: 3, render: renderNumber(formatCurrency) }},
+                {{ title: "SPED Funding Gap", data: 4, render: renderNumber(formatCurrency) }}
+            ];
+            let options = {{
                 columns: columns,
                 pageLength: 10,
+                lengthMenu: [[10, 25, 50, 100, -1], [10, 25, 50, 100, 'All']],
+                searchDelay: 200,
                 autoWidth: false,
                 order: [[4, 'asc']]
-            }});
+            }};
+            const inlinePayload = document.getElementById(entity + '-data');
+            if (inlinePayload) {{
+                const payload = JSON.parse(inlinePayload.textContent);
+                if (payload.orders) {{
+                    options.serverSide = true;
+                    options.ajax = localSource(payload);
+                }} else {{
+                    options.data = payloadToRows(payload);
+                }}
+            }} else {{
+                const manifest = JSON.parse(document.getElementById('shard-manifest').textContent);
+                options.serverSide = true;
+                options.searchDelay = 300;
+                // "All" and other lengths fall back to the full payload in shardSource.
+                options.lengthMenu = [manifest.pageSizes.concat([-1]), manifest.pageSizes.concat(['All'])];
+                options.ajax = shardSource(entity, manifest);
+            }}
+            let html = `<table id="${{tableId}}" class="display"></table>`;
+            document.getElementById(containerId).innerHTML = html;
+            let dt = new DataTable(`#${{tableId}}`, options);
 
             // Setup chart container: the chart will be placed above the table controls
             const chartContainerId = containerId.replace("table-container", "chart-container");
@@ -308,90 +1616,99 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
             // Create a canvas for the chart and a download button
             chartContainer.innerHTML = '<canvas id="' + tableId + '-chart" style="max-height:400px; min-height: 400px;"></canvas><br><button id="' + tableId + '-download">Download Chart</button>';            const ctx = document.getElementById(tableId + '-chart').getContext('2d');
 
-            function updateChart() {{
-                let currentData = dt.rows({{ page: 'current' }}).data().toArray();
-                let labels = currentData.map(row => row["District Name"]);
-                let spentData = currentData.map(row => parseFloat(row["Spent"]));
-                let receivedData = currentData.map(row => parseFloat(row["Received"]));
-
-                console.log("Chart Data:", labels, spentData, receivedData);
-
-                // Destroy previous chart for this table if exists
-                window.chartInstances = window.chartInstances || {{}};
-                if (window.chartInstances[tableId]) {{
-                    window.chartInstances[tableId].destroy();
-                }}
-                window.chartInstances[tableId] = new Chart(ctx, {{
-                    type: 'bar',
-                    plugins: [plugin],
-                    data: {{
-                        labels: labels,
-                        datasets: [
-                            {{
-                                label: 'Spent',
-                                data: spentData,
-                                backgroundColor: 'darkred'
-                            }},
-                            {{
-                                label: 'Received',
-                                data: receivedData,
-                                backgroundColor: 'lightcoral'
+            // One chart per table, created once; draws only swap its data.
+            window.chartInstances = window.chartInstances || {{}};
+            const chart = window.chartInstances[tableId] = new Chart(ctx, {{
+                type: 'bar',
+                plugins: [plugin],
+                data: {{
+                    labels: [],
+                    datasets: [
+                        {{
+                            label: 'Spent',
+                            data: [],
+                            backgroundColor: 'darkred'
+                        }},
+                        {{
+                            label: 'Received',
+                            data: [],
+                            backgroundColor: 'lightcoral'
+                        }}
+                    ]
+                }},
+                options: {{
+                    maintainAspectRatio: false,
+                    animation: {{
+                        duration: 300,
+                        easing: 'easeOutQuart'
+                    }},
+                    scales: {{
+                        y: {{
+                            ticks: {{
+                                callback: function(value, index, values) {{
+                                    return '$' + value.toLocaleString();
+                                }}
                             }}
-                        ]
+                        }}
                     }},
-                    options: {{
-                        maintainAspectRatio: false,
-                        animation: {{
-                            duration: 1000,
-                            easing: 'easeOutQuart'
+                    plugins: {{
+                        customCanvasBackgroundColor: {{
+                            color: 'white',
                         }},
-                        scales: {{
-                            y: {{
-                                ticks: {{
-                                    callback: function(value, index, values) {{
-                                        return '$' + value.toLocaleString();
-                                    }}
-                                }}
+                        title: {{
+                            display: true,
+                            text: tableId.indexOf("districts") !== -1 ? "Districts by " + SCHOOL_YEAR + " SPED Funding Gap" : "Charters by " + SCHOOL_YEAR + " SPED Funding Gap",
+                            color: 'black',
+                            font: {{
+                                size: 20
                             }}
                         }},
-                        plugins: {{
-                            customCanvasBackgroundColor: {{
-                                color: 'white',
-                            }},
-                            title: {{
-                                display: true,
-                                text: tableId.indexOf("districts") !== -1 ? "Districts by 2022-2023 SPED Funding Gap" : "Charters by 2022-2023 SPED Funding Gap",
-                                color: 'black',
-                                font: {{
-                                    size: 20
-                                }}
-                            }},
-                            legend: {{
-                                display: true,
-                                labels: {{
-                                    boxWidth: 12
-                                }}
-                            }},
+                        legend: {{
+                            display: true,
+                            labels: {{
+                                boxWidth: 12
+                            }}
                         }},
-                    }}
-                }});
+                    }},
+                }}
+            }});
+
+            function updateChart() {{
+                const series = chartSeries(dt.rows({{ page: 'current' }}).data().toArray());
+                chart.data.labels = series.labels;
+                chart.data.datasets[0].data = series.spent;
+                chart.data.datasets[1].data = series.received;
+                chart.data.datasets[0].label = series.grouped ? 'Spent (average per bar)' : 'Spent';
+                chart.data.datasets[1].label = series.grouped ? 'Received (average per bar)' : 'Received';
+                // Animating hundreds of bars costs more than it shows.
+                chart.update(series.grouped ? 'none' : undefined);
+            }}
+
+            // Draws can fire in bursts (sorting, paging, typing); redraw the chart
+            // at most once per frame.
+            let chartFrame = null;
+            function scheduleChartUpdate() {{
+                if (chartFrame === null) {{
+                    chartFrame = requestAnimationFrame(() => {{
+                        chartFrame = null;
+                        updateChart();
+                    }});
+                }}
             }}
 
             updateChart();
-            dt.on('draw', function() {{
-                updateChart();
-            }});
+            dt.on('draw', scheduleChartUpdate);
 
             document.getElementById(tableId + '-download').addEventListener('click', function() {{
                 let link = document.createElement('a');
                 link.href = window.chartInstances[tableId].toBase64Image();
-                link.download = tableId.replace('-table-container-table', '_22.23 SPED funding gap') + ' chart.png';
+                link.download = tableId.replace('-table-container-table', '_' + SCHOOL_YEAR.slice(2, 4) + '.' + SCHOOL_YEAR.slice(7) + ' SPED funding gap') + ' chart.png';
                 link.click();
             }});
         }}
 
-        renderDataTable({districts_json}, 'districts-table-container');
-        renderDataTable({charters_json}, 'charters-table-container');
+{render_calls}
+        renderAnalyticsCharts();
     </script>
     <script>
       window.addEventListener("load", () => {{
@@ -404,20 +1721,807 @@ def generate_sped_funding_gap_html(input_excel, output_html, development_mode=Fa
     </body>
     </html>
     """)
+    if minify:
+        page_head, page_tail = minify_markup(page_head), minify_markup(page_tail)
+    return page_head, page_tail
+
+
+def render_report(frames, output_html, payload_format="columnar", report_payload_size=False,
+                  stream_output=True, shard_dir=None, shard_page_sizes=SHARD_PAGE_SIZES, bundle=False,
+                  analytics=None):
+    # frames maps entity ("districts", "charters") to its prepared frame; only the
+    # entities present get a summary block, chart and table. bundle serves the
+    # third-party assets from vendor/, minifies the page and precompresses every
+    # artifact, so the report can be hosted without CDN access. analytics, from
+    # load_gap_analytics, is computed from frames when not given.
+    if payload_format not in PAYLOAD_FORMATS:
+        raise ValueError(f"payload_format must be one of {PAYLOAD_FORMATS}, got {payload_format!r}")
+
+    if analytics is None:
+        analytics = load_gap_analytics(frames)
+
+    if report_payload_size:
+        for entity, df in frames.items():
+            print_payload_size_report(ENTITY_LABELS[entity], df, payload_format)
+
+    page_dir = os.path.dirname(os.path.abspath(output_html))
+    tags = vendor_paths = None
+    if bundle:
+        vendor_paths = vendor_assets(os.path.join(page_dir, VENDOR_DIR))
+        tags = vendored_asset_tags(vendor_paths, page_dir)
+
+    with profile_stage("template rendering"):
+        page_head, page_tail = render_page_shell(frames, analytics, tags, minify=bundle)
+
+    if shard_dir is not None:
+        # shard_dir is relative to the page so the same URLs work on any static host.
+        shard_root = os.path.join(page_dir, shard_dir)
+        with profile_stage("shards"):
+            entities = {
+                entity: write_shards(shard_root, entity, df, shard_page_sizes)
+                for entity, df in frames.items()
+            }
+        data_scripts = iter_shard_manifest_script(shard_dir.replace(os.sep, "/"), shard_page_sizes, entities)
+    else:
+        data_scripts = itertools.chain.from_iterable(
+            iter_data_script(f"{entity}-data", df, payload_format) for entity, df in frames.items()
+        )
+    data_scripts = itertools.chain(iter_analytics_script(analytics), data_scripts)
+    pieces = itertools.chain([page_head], profile_iter("serialization", data_scripts), [page_tail])
+    with open(output_html, "w") as f:
+        if stream_output:
+            # Write the shell and the payload piece by piece instead of building
+            # the whole document in memory first.
+            for piece in pieces:
+                with profile_stage("file write"):
+                    f.write(piece)
+        else:
+            document = "".join(pieces)
+            with profile_stage("file write"):
+                f.write(document)
+
+    if bundle:
+        with profile_stage("precompression"):
+            artifacts = [output_html, *vendor_paths.values()]
+            if shard_dir is not None:
+                artifacts.extend(iter_files(shard_root))
+            precompress_site(output_html, artifacts)
+
+
+def resolve_profile(profile):
+    # profile: None reads SPED_PROFILE from the environment; True writes
+    # <output>.profile.json; "cprofile" also writes <output>.prof.
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV_VAR, "")
+        if profile != "cprofile":
+            profile = profile.lower() not in ("", "0", "false", "no")
+    return profile
+
+
+class LiveReload:
+    # Counts finished rebuilds; each open event stream waits for the count to move.
+    def __init__(self):
+        self.generation = 0
+        self.condition = threading.Condition()
+
+    def notify(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, generation, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+def dev_request_handler(page_dir, page_name, live_reload):
+    class DevRequestHandler(http.server.SimpleHTTPRequestHandler):
+        # Serves page_dir without chdir; the page itself goes out uncached with the
+        # live-reload client appended, so the file on disk stays deployable as is.
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == LIVE_RELOAD_PATH:
+                self.send_reload_events()
+            elif path in ("/", "/" + page_name):
+                self.send_page()
+            else:
+                super().do_GET()
+
+        def send_page(self):
+            with open(os.path.join(page_dir, page_name), "rb") as f:
+                body = f.read()
+            head, sep, tail = body.rpartition(b"</body>")
+            body = head + LIVE_RELOAD_SCRIPT.encode() + sep + tail if sep else body + LIVE_RELOAD_SCRIPT.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_reload_events(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            generation = live_reload.generation
+            try:
+                while True:
+                    latest = live_reload.wait(generation, timeout=15)
+                    # A comment line keeps idle connections from timing out.
+                    self.wfile.write(b"data: reload\n\n" if latest != generation else b": ping\n\n")
+                    self.wfile.flush()
+                    generation = latest
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            if not self.path.startswith(LIVE_RELOAD_PATH):
+                super().log_message(format, *args)
+
+    return functools.partial(DevRequestHandler, directory=page_dir)
+
+
+def load_generator_module():
+    # A fresh copy of this file, so template edits apply without re-reading the
+    # workbook; imported libraries are shared through sys.modules.
+    spec = importlib.util.spec_from_file_location("gen_html_live", os.path.abspath(__file__))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def file_mtimes(paths):
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtimes[path] = None
+    return mtimes
+
+
+def watch_and_serve(input_excel, output_html, frames, cache_dir=None, read_chunksize=None,
+                    port=DEV_SERVER_PORT, interval=WATCH_INTERVAL, **render_options):
+    # Serves the built page from an in-process threaded server, then polls the
+    # source files and this generator. A source change re-reads the frames; a
+    # generator change only re-renders the frames kept in memory, unless it also
+    # bumps CACHE_VERSION. Blocks until interrupted.
+    page_dir = os.path.dirname(os.path.abspath(output_html))
+    page_name = os.path.basename(output_html)
+    live_reload = LiveReload()
+    server = http.server.ThreadingHTTPServer(("", port), dev_request_handler(page_dir, page_name, live_reload))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {page_name} at http://localhost:{server.server_address[1]}/ (Ctrl-C to stop)")
+
+    generator = sys.modules[__name__]
+    source_files = sorted(set(source_paths(input_excel).values()))
+    template_files = [os.path.abspath(__file__)]
+    seen = file_mtimes(source_files + template_files)
+    try:
+        while True:
+            time.sleep(interval)
+            current = file_mtimes(source_files + template_files)
+            changed = [path for path in current if current[path] != seen[path]]
+            if not changed or None in (current[path] for path in changed):
+                # Editors often replace files in two steps; wait for the new copy.
+                continue
+            seen = current
+            start = time.perf_counter()
+            try:
+                reparse = any(path in source_files for path in changed)
+                if any(path in template_files for path in changed):
+                    previous_version = generator.CACHE_VERSION
+                    generator = load_generator_module()
+                    reparse = reparse or generator.CACHE_VERSION != previous_version
+                if reparse:
+                    digest = generator.source_digest(input_excel) if cache_dir is not None else None
+                    frames = generator.load_prepared_sheets(input_excel, cache_dir, digest, read_chunksize)
+                generator.render_report(frames, output_html, **render_options)
+            except Exception:
+                # Keep serving the last good page until the next save fixes the error.
+                traceback.print_exc()
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            names = ", ".join(os.path.basename(path) for path in changed)
+            print(f"Rebuilt {page_name} after changes to {names} in {elapsed:.0f} ms"
+                  f"{' (re-read sources)' if reparse else ''}")
+            live_reload.notify()
+    except KeyboardInterrupt:
+        print("Stopping development server")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def generate_sped_funding_gap_html(input_excel, output_html, development_mode=False,
+                                   payload_format="columnar", report_payload_size=False,
+                                   cache_dir=None, force=False, read_chunksize=None, stream_output=True,
+                                   shard_dir=None, shard_page_sizes=SHARD_PAGE_SIZES, bundle=False, profile=None,
+                                   port=DEV_SERVER_PORT):
+    # development_mode builds the page, then serves it with live reload and
+    # rebuilds on every source or generator change (see watch_and_serve).
+    profile = resolve_profile(profile)
+    if payload_format not in PAYLOAD_FORMATS:
+        raise ValueError(f"payload_format must be one of {PAYLOAD_FORMATS}, got {payload_format!r}")
+
+    with profiling(profile, input_excel, output_html):
+        workbook_digest = source_digest(input_excel) if cache_dir is not None else None
+        if cache_dir is not None and not force and not development_mode:
+            output_key = build_output_key(workbook_digest, payload_format, shard_dir, shard_page_sizes, bundle)
+            if output_is_current(cache_dir, output_html, output_key, shard_dir):
+                print(f"{output_html} is up to date, skipping build")
+                return
+
+        frames = load_prepared_sheets(input_excel, cache_dir, workbook_digest, read_chunksize)
+        analytics = load_gap_analytics(frames, cache_dir, workbook_digest)
+
+        render_report(frames, output_html, payload_format=payload_format, report_payload_size=report_payload_size,
+                      stream_output=stream_output, shard_dir=shard_dir, shard_page_sizes=shard_page_sizes,
+                      bundle=bundle, analytics=analytics)
+
+        if cache_dir is not None:
+            record_output(cache_dir, output_html,
+                          build_output_key(workbook_digest, payload_format, shard_dir, shard_page_sizes, bundle),
+                          shard_dir)
 
     if development_mode:
-        output_dir = os.path.dirname(os.path.abspath(output_html))
-        os.chdir(output_dir)
-        print("Starting development server at http://localhost:8000...")
-        subprocess.run(["python3", "-m", "http.server", "8000"])
+        watch_and_serve(input_excel, output_html, frames, cache_dir=cache_dir, read_chunksize=read_chunksize,
+                        port=port, payload_format=payload_format, stream_output=stream_output,
+                        shard_dir=shard_dir, shard_page_sizes=shard_page_sizes, bundle=bundle)
+
+
+def load_batch_manifest(manifest_path):
+    # Manifest format (paths are relative to the manifest file):
+    #
+    #   {
+    #     "cache_dir": ".build_cache",
+    #     "defaults": {"payload_format": "columnar"},
+    #     "jobs": [
+    #       {"input": "2022-2023.xlsx", "output": "site/index.html"},
+    #       {"input": "2022-2023.xlsx", "output": "site/region-10/index.html", "filter": {"Region": 10}},
+    #       {"input": "2022-2023.xlsx", "output": "site/charters/index.html", "entities": ["charters"]}
+    #     ]
+    #   }
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get("defaults", {})
+
+    jobs = []
+    for job in manifest["jobs"]:
+        job = {**defaults, **job}
+        unknown = set(job) - {"input", "output", "entities", "filter"} - BATCH_RENDER_OPTIONS
+        if unknown:
+            raise ValueError(f"Unknown batch job keys for {job.get('output')}: {sorted(unknown)}")
+        entities = job.pop("entities", list(ENTITY_SHEETS))
+        unknown_entities = set(entities) - set(ENTITY_SHEETS)
+        if unknown_entities:
+            raise ValueError(f"Unknown entities for {job['output']}: {sorted(unknown_entities)}")
+        jobs.append({
+            "input": os.path.join(base_dir, job.pop("input")),
+            "output": os.path.join(base_dir, job.pop("output")),
+            "entities": entities,
+            "filter": job.pop("filter", {}),
+            "options": job,
+        })
+
+    cache_dir = manifest.get("cache_dir")
+    if cache_dir is not None:
+        cache_dir = os.path.join(base_dir, cache_dir)
+    return jobs, cache_dir
+
+
+def filter_frame(df, filters):
+    for column, value in filters.items():
+        if column not in df.columns:
+            raise KeyError(f"Filter column {column!r} is not in the data; available: {list(df.columns)}")
+        df = df[df[column].isin(value)] if isinstance(value, list) else df[df[column] == value]
+    return df
+
+
+def parse_batch_input(input_excel, cache_dir):
+    start = time.perf_counter()
+    frames = load_prepared_sheets(input_excel, cache_dir)
+    return frames, time.perf_counter() - start
+
+
+def render_batch_job(frames, output_html, options):
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output_html)), exist_ok=True)
+    render_report(frames, output_html, **options)
+    return time.perf_counter() - start
+
+
+def run_batch(manifest_path, workers=None):
+    # Parses every distinct workbook once, then renders all outputs from the shared
+    # frames on a process pool. Returns a process exit code: 1 if any job failed.
+    jobs, cache_dir = load_batch_manifest(manifest_path)
+    batch_start = time.perf_counter()
+    failures = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        parse_futures = {
+            pool.submit(parse_batch_input, input_excel, cache_dir): input_excel
+            for input_excel in sorted({job["input"] for job in jobs})
+        }
+        parsed = {}
+        for future in concurrent.futures.as_completed(parse_futures):
+            input_excel = parse_futures[future]
+            try:
+                parsed[input_excel], seconds = future.result()
+                print(f"parsed  {seconds:8.2f}s  {input_excel}")
+            except Exception as e:
+                # Counted as failures below, once per job that needed this input.
+                print(f"FAILED  {'':>9}  {input_excel}: {e!r}")
+
+        render_futures = {}
+        for job in jobs:
+            if job["input"] not in parsed:
+                failures += 1
+                print(f"SKIPPED {'':>9}  {job['output']}: input failed to parse")
+                continue
+            try:
+                # Filter in the parent so each worker only receives the rows it renders.
+                frames = {
+                    entity: filter_frame(parsed[job["input"]][entity], job["filter"])
+                    for entity in job["entities"]
+                }
+            except KeyError as e:
+                failures += 1
+                print(f"FAILED  {'':>9}  {job['output']}: {e}")
+                continue
+            render_futures[pool.submit(render_batch_job, frames, job["output"], job["options"])] = job
+
+        for future in concurrent.futures.as_completed(render_futures):
+            job = render_futures[future]
+            try:
+                print(f"wrote   {future.result():8.2f}s  {job['output']}")
+            except Exception as e:
+                failures += 1
+                print(f"FAILED  {'':>9}  {job['output']}: {e!r}")
+
+    print(f"{len(jobs) - failures}/{len(jobs)} jobs succeeded in {time.perf_counter() - batch_start:.2f}s")
+    return 1 if failures else 0
+
+
+def read_timeseries_manifest(store_dir):
+    path = os.path.join(store_dir, "store.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == TIMESERIES_VERSION:
+            return manifest
+        print(f"{store_dir} was written by an older version; rebuilding it")
+    return {"version": TIMESERIES_VERSION, "years": {}}
+
+
+def write_timeseries_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, "store.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def year_partition_path(store_dir, year):
+    return os.path.join(store_dir, "years", f"{year}.pkl")
+
+
+def long_format(frames):
+    # One row per district for the year, keyed by its integer district number.
+    rows = pd.concat([df.assign(Entity=entity) for entity, df in frames.items()], ignore_index=True)
+    rows = rows[TIMESERIES_COLUMNS]
+    rows["School Year"] = rows["School Year"].astype(str)
+    duplicated = rows["District Number"].duplicated()
+    if duplicated.any():
+        print(f"Warning: {int(duplicated.sum())} repeated district numbers in {rows['School Year'].iat[0]}; "
+              f"keeping the first row of each")
+        rows = rows[~duplicated].reset_index(drop=True)
+    return rows
+
+
+def add_year_deltas(rows, previous):
+    # Change against the previous school year in the store, joined on the integer
+    # district number. Districts new this year get nulls.
+    if previous is None:
+        prior = pd.Series(float("nan"), index=rows.index)
+    else:
+        prior = rows["District Number"].map(previous.set_index("District Number")["SPED Funding Gap"])
+    rows["Previous Gap"] = prior
+    rows["Gap Change"] = rows["SPED Funding Gap"] - prior
+    rows["Gap Change %"] = rows["Gap Change"] / prior.abs().where(prior != 0) * 100
+    return rows
+
+
+def update_timeseries_store(store_dir, inputs, cache_dir=None):
+    # Adds each workbook's school year to the store, skipping workbooks already in
+    # it. Only new years are parsed; deltas are recomputed for them and for the year
+    # after each (whose previous year changed), and the sparkline table gains one
+    # column per new year. A changed workbook for a stored year replaces that year.
+    os.makedirs(os.path.join(store_dir, "years"), exist_ok=True)
+    manifest = read_timeseries_manifest(store_dir)
+    stored_digests = {entry["digest"] for entry in manifest["years"].values()}
+
+    partitions, added = {}, []
+    for input_excel in inputs:
+        digest = source_digest(input_excel)
+        if digest in stored_digests:
+            print(f"{input_excel} is already in {store_dir}, skipping")
+            continue
+        frames = load_prepared_sheets(input_excel, cache_dir, digest if cache_dir is not None else None)
+        year = school_year(frames)
+        with profile_stage("aggregation"):
+            summary = group_gap_stats(gap_frame(frames), ["Entity"])
+        partitions[year] = long_format(frames)
+        manifest["years"][year] = {
+            "source": os.path.abspath(input_excel),
+            "digest": digest,
+            "rows": len(partitions[year]),
+            "summary": summary,
+        }
+        stored_digests.add(digest)
+        added.append(year)
+        print(f"Added {year} ({len(partitions[year]):,} rows) from {input_excel}")
+    if not added:
+        return manifest
+
+    def partition(year):
+        if year not in partitions:
+            partitions[year] = pd.read_pickle(year_partition_path(store_dir, year))
+        return partitions[year]
+
+    years = sorted(manifest["years"])
+    stale = set(added)
+    stale.update(years[years.index(year) + 1] for year in added if year != years[-1])
+    with profile_stage("year deltas"):
+        for year in sorted(stale):
+            position = years.index(year)
+            previous = partition(years[position - 1]) if position else None
+            add_year_deltas(partition(year), previous).to_pickle(year_partition_path(store_dir, year))
+
+    with profile_stage("sparklines"):
+        sparklines_path = os.path.join(store_dir, "sparklines.pkl")
+        sparklines = pd.read_pickle(sparklines_path) if os.path.exists(sparklines_path) else pd.DataFrame()
+        for year in added:
+            gaps = partition(year).set_index("District Number")["SPED Funding Gap"].rename(year)
+            sparklines = sparklines.drop(columns=year, errors="ignore").join(gaps, how="outer")
+        sparklines = sparklines[sorted(sparklines.columns)]
+        sparklines.index.name = "District Number"
+        sparklines.to_pickle(sparklines_path)
+
+    write_timeseries_manifest(store_dir, manifest)
+    return manifest
+
+
+def json_values(values, decimals=0):
+    # Rounded numbers for a JSON payload, with NaN as null; whole numbers when
+    # decimals is 0. Accepts a Series or a DataFrame (one list per row).
+    rounded = values.round(decimals)
+    if decimals == 0:
+        rounded = rounded.astype("Int64")
+    return rounded.astype(object).where(rounded.notna(), None).to_numpy().tolist()
+
+
+def iter_trend_data_script(entity, rows, sparklines):
+    payload = {
+        "year": rows["School Year"].iat[0] if len(rows) else None,
+        "years": list(sparklines.columns),
+        "number": rows["District Number"].tolist(),
+        "name": rows["District Name"].tolist(),
+        "gap": json_values(rows["SPED Funding Gap"]),
+        "change": json_values(rows["Gap Change"]),
+        "changePct": json_values(rows["Gap Change %"], 1),
+        "spark": json_values(sparklines.reindex(rows["District Number"])),
+    }
+    yield f'<script type="application/json" id="{entity}-trend-data">'
+    yield json.dumps(payload, separators=(",", ":")).replace("</", "<\\/")
+    yield "</script>\n"
+
+
+def year_net_gaps(manifest):
+    # {year: {entity: net gap}} from the per-year summaries in the store manifest.
+    return {
+        year: {row["Entity"]: row["net_gap"] for row in manifest["years"][year]["summary"]}
+        for year in sorted(manifest["years"])
+    }
+
+
+def year_rows_html(manifest, entities):
+    header = "".join(f"<th>{ENTITY_LABELS[entity]}</th>" for entity in entities)
+    rows = [f"        <tr><th>School Year</th>{header}<th>Total</th><th>Change</th></tr>"]
+    previous_total = None
+    for year, gaps in year_net_gaps(manifest).items():
+        total = sum(gaps.get(entity, 0) for entity in entities)
+        cells = "".join(f"<td>{format_currency(gaps.get(entity, 0))}</td>" for entity in entities)
+        change = "" if previous_total is None else format_currency(total - previous_total)
+        rows.append(f"        <tr><td>{year}</td>{cells}<td>{format_currency(total)}</td><td>{change}</td></tr>")
+        previous_total = total
+    return "\n".join(rows)
+
+
+def trend_section_html(entity):
+    return "\n".join([
+        '    <div style="border: 1px solid lightgrey; border-radius: 4px; padding: 15px; margin-top: 30px;">',
+        f"        <h3>{ENTITY_LABELS[entity]}</h3>",
+        '        <div class="table-container">',
+        f'            <div id="{entity}-trend-table-container"></div>',
+        "        </div>",
+        "    </div>",
+        "",
+    ])
+
+
+def render_timeseries_shell(manifest, entities, tags=None, minify=False):
+    # The trends page around its data payloads, sharing the single-year page's
+    # head, styles and header.
+    tags = tags or cdn_asset_tags()
+    years = sorted(manifest["years"])
+    first, last = years[0], years[-1]
+    year_rows = year_rows_html(manifest, entities)
+    trend_sections = "\n".join(trend_section_html(entity) for entity in entities)
+    render_calls = "\n".join(f"        renderTrendTable('{entity}');" for entity in entities)
+
+    page_head = render_masthead(f"SPED Funding Gap Trends ({first} to {last})",
+                                f"Special Education Funding Gap, {first} to {last}", tags)
+    page_head += textwrap.dedent(f"""\
+    <p>
+        The following analysis tracks the special education (SPED) funding gap for Texas public school districts and charter schools over the {len(years)} school years from {first} to {last}, using final data publicly available from the Texas Education Agency. Each change compares a district with the previous school year in the series.
+    </p>
+
+    <h3 style="margin-top: 30px;">Net Funding Gap by Year</h3>
+    <table class="year-stats">
+{year_rows}
+    </table>
+    <div id="trend-chart-container" style="margin-bottom: 20px;"></div>
 
+{trend_sections}
+    {tags['jquery']}
+    {tags['datatables']}
+    {tags['chartjs']}
+
+    """)
+
+    page_tail = textwrap.dedent(f"""\
+    <script type="application/json" id="trend-summary">{json.dumps(year_net_gaps(manifest), separators=(",", ":"))}</script>
+    <script>
+        const ENTITY_LABELS = {json.dumps(ENTITY_LABELS)};
+        const SPARKLINE_WIDTH = 120;
+        const SPARKLINE_HEIGHT = 24;
+        const numberFormat = new Intl.NumberFormat('en-US');
+
+        function formatCurrency(value) {{
+            return value < 0 ? '-$' + numberFormat.format(-value) : '$' + numberFormat.format(value);
+        }}
+
+        // Null (no previous year) shows blank and, through the "change" column
+        // type, sorts after every number in both directions.
+        function renderChange(formatter) {{
+            return function(value, type) {{
+                if (type === 'display' || type === 'filter') {{
+                    return value === null ? '' : (value > 0 ? '+' : '') + formatter(value);
+                }}
+                return value;
+            }};
+        }}
+
+        function compareChange(a, b, direction) {{
+            if (a === null || b === null) {{
+                return (a === null) - (b === null);
+            }}
+            return (a - b) * direction;
+        }}
+        DataTable.ext.type.order['change-asc'] = (a, b) => compareChange(a, b, 1);
+        DataTable.ext.type.order['change-desc'] = (a, b) => compareChange(a, b, -1);
+
+        function sparkline(values) {{
+            const present = values.filter(v => v !== null);
+            if (present.length < 2) {{
+                return '';
+            }}
+            const min = Math.min(...present);
+            const span = Math.max(...present) - min || 1;
+            const points = [];
+            values.forEach((v, i) => {{
+                if (v !== null) {{
+                    const x = i / (values.length - 1) * SPARKLINE_WIDTH;
+                    const y = SPARKLINE_HEIGHT - (v - min) / span * SPARKLINE_HEIGHT;
+                    points.push(x.toFixed(1) + ',' + y.toFixed(1));
+                }}
+            }});
+            return `<svg width="${{SPARKLINE_WIDTH}}" height="${{SPARKLINE_HEIGHT}}" viewBox="-2 -2 ${{SPARKLINE_WIDTH + 4}} ${{SPARKLINE_HEIGHT + 4}}">` +
+                `<polyline fill="none" stroke="darkred" stroke-width="1.5" points="${{points.join(' ')}}"/></svg>`;
+        }}
+
+        function renderTrendTable(entity) {{
+            const payload = JSON.parse(document.getElementById(entity + '-trend-data').textContent);
+            const rows = payload.name.map((name, i) =>
+                [name, payload.gap[i], payload.change[i], payload.changePct[i], payload.spark[i]]);
+            const tableId = entity + '-trend-table';
+            document.getElementById(entity + '-trend-table-container').innerHTML =
+                `<table id="${{tableId}}" class="display"></table>`;
+            new DataTable(`#${{tableId}}`, {{
+                data: rows,
+                columns: [
+                    {{ title: "District Name" }},
+                    {{ title: payload.year + " Funding Gap", render: (v, type) => type === 'display' || type === 'filter' ? formatCurrency(v) : v }},
+                    {{ title: "Change", type: "change", render: renderChange(formatCurrency) }},
+                    {{ title: "Change %", type: "change", render: renderChange(v => v.toFixed(1) + '%') }},
+                    {{ title: payload.years[0] + " to " + payload.year, orderable: false, searchable: false,
+                       render: (v, type) => type === 'display' ? sparkline(v) : '' }}
+                ],
+                pageLength: 10,
+                lengthMenu: [[10, 25, 50, 100, -1], [10, 25, 50, 100, 'All']],
+                searchDelay: 200,
+                autoWidth: false,
+                order: [[2, 'asc']]
+            }});
+        }}
+
+        function renderTrendChart() {{
+            const summary = JSON.parse(document.getElementById('trend-summary').textContent);
+            const years = Object.keys(summary);
+            const colors = {{ districts: 'darkred', charters: 'lightcoral' }};
+            const entities = Object.keys(ENTITY_LABELS).filter(entity => years.some(year => entity in summary[year]));
+            const container = document.getElementById('trend-chart-container');
+            const canvas = document.createElement('canvas');
+            canvas.style.maxHeight = '300px';
+            canvas.style.minHeight = '300px';
+            container.appendChild(canvas);
+            new Chart(canvas.getContext('2d'), {{
+                type: 'line',
+                plugins: [plugin],
+                data: {{
+                    labels: years,
+                    datasets: entities.map(entity => ({{
+                        label: ENTITY_LABELS[entity],
+                        data: years.map(year => entity in summary[year] ? summary[year][entity] : null),
+                        borderColor: colors[entity],
+                        backgroundColor: colors[entity]
+                    }}))
+                }},
+                options: {{
+                    maintainAspectRatio: false,
+                    scales: {{
+                        y: {{
+                            ticks: {{
+                                callback: value => formatCurrency(value)
+                            }}
+                        }}
+                    }},
+                    plugins: {{
+                        customCanvasBackgroundColor: {{
+                            color: 'white',
+                        }},
+                        title: {{
+                            display: true,
+                            text: 'Net SPED Funding Gap by Year',
+                            color: 'black',
+                            font: {{
+                                size: 16
+                            }}
+                        }}
+                    }}
+                }}
+            }});
+        }}
+
+        renderTrendChart();
+{render_calls}
+    </script>
+    <script>
+      window.addEventListener("load", () => {{
+        document.body.classList.add("loaded");
+      }});
+    </script>
+    </body>
+    </html>
+    """)
+    if minify:
+        page_head, page_tail = minify_markup(page_head), minify_markup(page_tail)
+    return page_head, page_tail
+
+
+def render_timeseries_report(store_dir, output_html, manifest, bundle=False):
+    # Reads only the latest year's partition and the sparkline table, so the page
+    # costs the same however many years the store holds.
+    years = sorted(manifest["years"])
+    latest = pd.read_pickle(year_partition_path(store_dir, years[-1]))
+    sparklines = pd.read_pickle(os.path.join(store_dir, "sparklines.pkl"))
+    entities = [entity for entity in ENTITY_SHEETS if (latest["Entity"] == entity).any()]
+
+    page_dir = os.path.dirname(os.path.abspath(output_html))
+    tags = vendor_paths = None
+    if bundle:
+        vendor_paths = vendor_assets(os.path.join(page_dir, VENDOR_DIR))
+        tags = vendored_asset_tags(vendor_paths, page_dir)
+
+    with profile_stage("template rendering"):
+        page_head, page_tail = render_timeseries_shell(manifest, entities, tags, minify=bundle)
+    data_scripts = itertools.chain.from_iterable(
+        iter_trend_data_script(entity, latest[latest["Entity"] == entity], sparklines) for entity in entities
+    )
+    pieces = itertools.chain([page_head], profile_iter("serialization", data_scripts), [page_tail])
     with open(output_html, "w") as f:
-        f.write(html_template)
+        for piece in pieces:
+            with profile_stage("file write"):
+                f.write(piece)
+
+    if bundle:
+        with profile_stage("precompression"):
+            precompress_site(output_html, [output_html, *vendor_paths.values()])
+
+
+def generate_timeseries_html(inputs, store_dir, output_html, cache_dir=None, bundle=False, profile=None):
+    # Multi-year trends page. inputs are yearly workbooks (or CSV/Parquet exports)
+    # to add to the store at store_dir; years already stored are kept, so adding a
+    # release only needs its own workbook.
+    profile = resolve_profile(profile)
+    with profiling(profile, store_dir, output_html):
+        manifest = update_timeseries_store(store_dir, inputs, cache_dir)
+        if not manifest["years"]:
+            raise ValueError(f"{store_dir} holds no school years yet; pass at least one workbook")
+        render_timeseries_report(store_dir, output_html, manifest, bundle=bundle)
 
 
 if __name__ == "__main__":
-    generate_sped_funding_gap_html(
-        "/Users/adpena/PycharmProjects/OSOD/OSOD 2024 Report_2022-2023 SPED Funding Gap.xlsx",
-        "index.html",
-        development_mode=False
-    )
+    parser = argparse.ArgumentParser(description="Generate the SPED funding gap report.")
+    parser.add_argument("inputs", nargs="*", metavar="input_excel",
+                        help="source workbook (Sheet1 districts, Sheet2 charters), or CSV/Parquet exports "
+                             "named with an {entity} placeholder, e.g. 'exports/{entity}.parquet'; "
+                             "with --series, any number of yearly workbooks to add")
+    parser.add_argument("--output", default="index.html", help="output HTML path (default index.html)")
+    parser.add_argument("--cache-dir", default=".build_cache", help="prepared-frame cache directory")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the output is up to date")
+    parser.add_argument("--read-chunksize", type=int, metavar="ROWS",
+                        help="read the input this many rows at a time to lower peak memory on very large sheets; "
+                             "workbooks are then read with openpyxl, which is slower than calamine")
+    parser.add_argument("--report-payload-size", action="store_true",
+                        help="print each data payload's size against the legacy records layout (slow on large inputs)")
+    parser.add_argument("--no-stream-output", dest="stream_output", action="store_false",
+                        help="build the whole page in memory and write it at once instead of piece by piece")
+    parser.add_argument("--shard-dir", metavar="DIR",
+                        help="write the rows as paged JSON shards in DIR, relative to --output, "
+                             "and fetch them on demand instead of embedding the data")
+    parser.add_argument("--bundle", action="store_true",
+                        help="serve vendored assets, minify the page and write .gz/.br siblings plus an integrity manifest")
+    parser.add_argument("--fetch-assets", action="store_true",
+                        help=f"download missing third-party assets into {VENDOR_DIR}/ next to --output")
+    parser.add_argument("--series", metavar="STORE_DIR",
+                        help="multi-year mode: add the workbooks' school years to this store and build a trends page")
+    parser.add_argument("--batch", metavar="MANIFEST", help="build every job in a JSON batch manifest")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for --batch")
+    parser.add_argument("--serve", action="store_true",
+                        help="serve the page with live reload and rebuild when the input or this generator changes")
+    parser.add_argument("--port", type=int, default=DEV_SERVER_PORT,
+                        help=f"development server port for --serve (default {DEV_SERVER_PORT})")
+    parser.add_argument("--profile", action="store_const", const=True, default=None,
+                        help=f"write a per-stage timing/memory report (or set {PROFILE_ENV_VAR}=1)")
+    parser.add_argument("--cprofile", dest="profile", action="store_const", const="cprofile",
+                        help="like --profile, and also dump cProfile stats")
+    args = parser.parse_args()
+
+    if args.fetch_assets:
+        vendor_assets(os.path.join(os.path.dirname(os.path.abspath(args.output)), VENDOR_DIR), fetch=True)
+    if args.batch:
+        sys.exit(run_batch(args.batch, args.workers))
+    if args.series:
+        generate_timeseries_html(args.inputs, args.series, args.output, cache_dir=args.cache_dir,
+                                 bundle=args.bundle, profile=args.profile)
+    else:
+        if len(args.inputs) != 1:
+            parser.error("exactly one input_excel is required unless --batch or --series is given")
+        generate_sped_funding_gap_html(
+            args.inputs[0],
+            args.output,
+            development_mode=args.serve,
+            report_payload_size=args.report_payload_size,
+            cache_dir=args.cache_dir,
+            force=args.force,
+            read_chunksize=args.read_chunksize,
+            stream_output=args.stream_output,
+            shard_dir=args.shard_dir,
+            bundle=args.bundle,
+            profile=args.profile,
+            port=args.port
+        )